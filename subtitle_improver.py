@@ -8,9 +8,16 @@
 import os
 import sys
 import re
+import glob
+import math
 import argparse
+import collections
+import functools
+import hashlib
+import json
+import sqlite3
 from pathlib import Path
-from typing import List, Tuple
+from typing import Callable, List, Tuple
 import tempfile
 import subprocess
 from datetime import datetime
@@ -27,85 +34,227 @@ if sys.platform == 'win32':
         sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
         sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
 
-from openai import OpenAI, AsyncOpenAI
+from openai import (
+    AsyncOpenAI, DefaultAsyncHttpxClient, RateLimitError, APIConnectionError, InternalServerError,
+    AuthenticationError, PermissionDeniedError
+)
 from dotenv import load_dotenv
 import asyncio
+import random
 import shutil
+import importlib.util
+import httpx
+
+# aiohttp-транспорт для AsyncOpenAI (pip install httpx-aiohttp), без него работаем через httpx
+try:
+    from openai import DefaultAioHttpClient
+except ImportError:
+    DefaultAioHttpClient = None
 
 # Загружаем переменные из .env файла
 load_dotenv()
 
 
-def find_ffmpeg() -> str:
+# Стандартные папки установки ffmpeg на Windows (общие для ffmpeg и ffprobe)
+FFMPEG_SEARCH_DIRS = [
+    r'C:\ffmpeg\bin',
+    r'C:\Program Files\ffmpeg\bin',
+    r'C:\Program Files (x86)\ffmpeg\bin',
+    os.path.expanduser(r'~\ffmpeg\bin'),
+    r'C:\ProgramData\chocolatey\bin',
+    os.path.expanduser(r'~\scoop\apps\ffmpeg\current\bin'),
+    os.path.expanduser(r'~\scoop\shims'),
+    # Локально в папке проекта
+    os.path.join(os.getcwd(), 'ffmpeg', 'bin'),
+    os.getcwd(),
+]
+
+
+@functools.lru_cache(maxsize=None)
+def find_binary(name: str) -> str:
     """
-    Ищет ffmpeg в разных местах на Windows
-    Возвращает путь к ffmpeg.exe или 'ffmpeg' если найден в PATH
+    Ищет исполняемый файл (ffmpeg/ffprobe) сначала в PATH, потом в стандартных местах на Windows
+    Возвращает имя если найден в PATH, полный путь к .exe, или None если не найден
+    Результат кэшируется - повторные вызовы не трогают файловую систему
     """
     # Сначала проверяем PATH
-    if shutil.which('ffmpeg'):
-        return 'ffmpeg'
-    
-    # Список стандартных мест установки на Windows
-    possible_paths = [
-        r'C:\ffmpeg\bin\ffmpeg.exe',
-        r'C:\Program Files\ffmpeg\bin\ffmpeg.exe',
-        r'C:\Program Files (x86)\ffmpeg\bin\ffmpeg.exe',
-        os.path.expanduser(r'~\ffmpeg\bin\ffmpeg.exe'),
-        r'C:\ProgramData\chocolatey\bin\ffmpeg.exe',
-        os.path.expanduser(r'~\scoop\apps\ffmpeg\current\bin\ffmpeg.exe'),
-        os.path.expanduser(r'~\scoop\shims\ffmpeg.exe'),
-        # Локально в папке проекта
-        os.path.join(os.getcwd(), 'ffmpeg', 'bin', 'ffmpeg.exe'),
-        os.path.join(os.getcwd(), 'ffmpeg.exe'),
-    ]
+    if shutil.which(name):
+        return name
     
-    for path in possible_paths:
-        if os.path.exists(path):
+    for directory in FFMPEG_SEARCH_DIRS:
+        path = os.path.join(directory, f"{name}.exe")
+        if os.path.isfile(path):
             return path
     
     # Не найден
     return None
 
 
+def find_ffmpeg() -> str:
+    """
+    Ищет ffmpeg в разных местах на Windows
+    Возвращает путь к ffmpeg.exe или 'ffmpeg' если найден в PATH
+    """
+    return find_binary('ffmpeg')
+
+
 def find_ffprobe() -> str:
     """
     Ищет ffprobe в разных местах на Windows
     Возвращает путь к ffprobe.exe или 'ffprobe' если найден в PATH
     """
-    # Сначала проверяем PATH
-    if shutil.which('ffprobe'):
-        return 'ffprobe'
-    
-    # Список стандартных мест установки на Windows
-    possible_paths = [
-        r'C:\ffmpeg\bin\ffprobe.exe',
-        r'C:\Program Files\ffmpeg\bin\ffprobe.exe',
-        r'C:\Program Files (x86)\ffmpeg\bin\ffprobe.exe',
-        os.path.expanduser(r'~\ffmpeg\bin\ffprobe.exe'),
-        r'C:\ProgramData\chocolatey\bin\ffprobe.exe',
-        os.path.expanduser(r'~\scoop\apps\ffmpeg\current\bin\ffprobe.exe'),
-        os.path.expanduser(r'~\scoop\shims\ffprobe.exe'),
-        # Локально в папке проекта
-        os.path.join(os.getcwd(), 'ffmpeg', 'bin', 'ffprobe.exe'),
-        os.path.join(os.getcwd(), 'ffprobe.exe'),
-    ]
-    
-    for path in possible_paths:
-        if os.path.exists(path):
-            return path
-    
-    # Не найден
-    return None
+    # ffprobe ставится вместе с ffmpeg - сначала одна проверка рядом с уже найденным ffmpeg.exe,
+    # а не повторный обход всех FFMPEG_SEARCH_DIRS
+    ffmpeg_path = find_ffmpeg()
+    if ffmpeg_path and os.path.dirname(ffmpeg_path):
+        sibling = os.path.join(os.path.dirname(ffmpeg_path), 'ffprobe.exe')
+        if os.path.isfile(sibling):
+            return sibling
+    return find_binary('ffprobe')
 
 
 # Глобальные переменные для путей к ffmpeg
 FFMPEG_PATH = None
 FFPROBE_PATH = None
 
+# Параметры mp3 для Whisper: модель всё равно работает с 16kHz моно,
+# поэтому 64k моно не теряет качества распознавания, а загрузка в 2 раза меньше чем 128k стерео
+AUDIO_BITRATE_KBPS = 64
+AUDIO_SAMPLE_RATE = 16000
+
+# Исходную mp3-дорожку не выше этого битрейта режем на части как есть (-c:a copy),
+# без декодирования и повторного кодирования; часть все равно укладывается в лимит Whisper
+AUDIO_COPY_MAX_KBPS = 160
+
+# tmpfs в оперативной памяти для временных частей аудио (Linux; на Windows их нет)
+# XDG_RUNTIME_DIR (/run/user/<uid>) - запасной вариант, если /dev/shm мал или закрыт в контейнере
+RAM_TEMP_DIRS = tuple(d for d in ('/dev/shm', os.environ.get('XDG_RUNTIME_DIR')) if d)
+
+# Модель для локальной транскрипции (--backend faster-whisper)
+FASTER_WHISPER_MODEL = os.environ.get('FASTER_WHISPER_MODEL', 'large-v3')
+
+# Сколько фрагментов речи faster-whisper декодирует за один проход (1 - отключить батчинг)
+FASTER_WHISPER_BATCH_SIZE = int(os.environ.get('FASTER_WHISPER_BATCH_SIZE', '16'))
+
+# Сколько чанков отправлять в Whisper API одновременно в режиме --parallel
+WHISPER_MAX_PARALLEL = int(os.environ.get('WHISPER_MAX_PARALLEL', '4'))
+
+# Лимит запросов в минуту к Whisper API (audio endpoint) - запросы идут сразу, пока есть запас
+WHISPER_RPM = int(os.environ.get('WHISPER_RPM', '50'))
+
+# Манифест чанков в папке кэша: план нарезки и какие чанки уже транскрибированы
+CHUNK_MANIFEST_NAME = 'manifest.json'
+
+# SUBTITLE_DEBUG=1 - сохранять сырой SRT от Whisper (*_raw_debug.srt) рядом с russian.srt
+SUBTITLE_DEBUG = os.environ.get('SUBTITLE_DEBUG') == '1'
+
+# Сколько последних строк stderr ffmpeg держать для сообщений об ошибках
+FFMPEG_STDERR_TAIL_LINES = 200
+
+# Кодировщик видео при вшивании субтитров: auto - аппаратный (NVENC / Quick Sync / AMF / VideoToolbox),
+# если он есть в сборке ffmpeg, иначе libx264; можно задать явно (например, libx264)
+VIDEO_ENCODER = os.environ.get('VIDEO_ENCODER', 'auto')
+
+# Параметры качества для кодировщиков (примерно как libx264 -crf 23); аппаратные - в порядке предпочтения
+VIDEO_ENCODER_ARGS = {
+    'h264_nvenc': ['-preset', 'p4', '-rc', 'vbr', '-cq', '23'],
+    'h264_qsv': ['-preset', 'faster', '-global_quality', '23'],
+    'h264_amf': ['-quality', 'balanced', '-rc', 'cqp', '-qp_i', '23', '-qp_p', '23'],
+    'h264_videotoolbox': ['-q:v', '65'],
+    'libx264': ['-preset', 'fast', '-crf', '23'],  # fast заметно быстрее medium при почти том же размере
+}
+
+# Признаки в stderr ffmpeg, что не запустился сам аппаратный кодировщик (нет GPU / драйвера / сессии),
+# а не битый SRT, нехватка места или плохой вход - только тогда есть смысл кодировать заново через libx264
+VIDEO_ENCODER_INIT_ERRORS = (
+    'error while opening encoder',
+    'could not open encoder',
+    'error initializing output stream',
+    'no nvenc capable devices',
+    'no capable devices found',
+    'openencodesessionex failed',
+    'cannot load',
+    'device creation failed',
+    'mfx session',  # Quick Sync
+    'amf failed', 'amfrt',  # AMD AMF
+)
+
+# Сколько символов текста предыдущего чанка передавать в Whisper как prompt
+WHISPER_PROMPT_CHARS = 200
+
+# Пул соединений к OpenAI: с запасом на все одновременные батчи перевода,
+# keep-alive соединения переиспользуются между retry раундами
+OPENAI_HTTP_LIMITS = httpx.Limits(max_connections=128, max_keepalive_connections=64, keepalive_expiry=30)
+
+# Сколько запросов перевода отправлять одновременно (подберите под RPM/TPM лимиты аккаунта)
+# Это потолок: при 429 число одновременных запросов снижается само и потом постепенно возвращается
+OPENAI_MAX_CONCURRENCY = int(os.environ.get('OPENAI_MAX_CONCURRENCY', '10'))
+
+# Временные ошибки OpenAI - запрос повторяется с паузой: 429, обрыв соединения / таймаут, 5xx
+OPENAI_TRANSIENT_ERRORS = (RateLimitError, APIConnectionError, InternalServerError)
+
+# Сколько раз пробовать запрос при 429 / таймауте (с экспоненциальной паузой)
+OPENAI_MAX_ATTEMPTS = 5
+
+# Потолок оценки входных токенов на батч перевода (кроме системного промпта):
+# длинные реплики закрывают батч раньше 40 записей, ответ модели укладывается в max_tokens
+TRANSLATION_BATCH_MAX_TOKENS = 2000
+
+# --batch-api: как часто опрашивать статус задания Batch API (результат приходит в пределах 24 часов)
+BATCH_API_POLL_SECONDS = 30
+
+# HTTP/2 (мультиплексирование запросов в одном соединении) доступен только с пакетом h2
+HTTP2_AVAILABLE = importlib.util.find_spec('h2') is not None
+
+# Установлен ли faster-whisper (--backend auto выбирает локальную транскрипцию если да)
+FASTER_WHISPER_AVAILABLE = importlib.util.find_spec('faster_whisper') is not None
+
+# Регулярные выражения компилируем один раз - они вызываются на каждую запись субтитров
+_CYRILLIC_RE = re.compile(r'[А-Яа-яЁё]')
+# [номер] перевод + строки-продолжения до пустой строки или следующего [номер]
+_BATCH_LINE_RE = re.compile(r'^[ \t]*\[(\d+)\][ \t]*(.+(?:\n(?![ \t]*\[\d+\])[ \t]*\S.*)*)', re.MULTILINE)
+_SRT_TIMESTAMP_RE = re.compile(r'(\d{2}):(\d{2}):(\d{2})[,.](\d{3})')
+# Строка индекса - только число, за которым сразу идет строка таймингов
+# (строка текста из одних цифр, например "2024", индексом не считается)
+_SRT_INDEX_LINE_RE = re.compile(r'^[ \t]*(\d+)[ \t\r]*$(?=\n[ \t]*\d{2}:\d{2}:\d{2}[,.]\d{3}[ \t]*-->)', re.MULTILINE)
+# Целый блок SRT: индекс, строка таймингов, текст до пустой строки (или конца файла)
+_SRT_BLOCK_RE = re.compile(
+    r'^[ \t]*(\d+)[ \t\r]*\n'
+    r'[ \t]*(\d{2}:\d{2}:\d{2}[,.]\d{3})[ \t]*-->[ \t]*(\d{2}:\d{2}:\d{2}[,.]\d{3})[^\n]*\n'
+    r'([ \t]*\S.*?)[ \t\r]*(?=\n[ \t\r]*\n|\s*\Z)',
+    re.MULTILINE | re.DOTALL
+)
+
+
+def create_async_client(api_key: str, **kwargs) -> AsyncOpenAI:
+    """
+    Создает AsyncOpenAI клиент на aiohttp-транспорте если он установлен
+    На десятках одновременных запросов httpx упирается в себя, aiohttp держит нагрузку заметно лучше
+    Без aiohttp - httpx с явным пулом соединений OPENAI_HTTP_LIMITS и HTTP/2 (если есть h2)
+    Клиент нужно закрыть после использования (await client.close())
+    """
+    if DefaultAioHttpClient is not None:
+        try:
+            return AsyncOpenAI(api_key=api_key, http_client=DefaultAioHttpClient(limits=OPENAI_HTTP_LIMITS), **kwargs)
+        except RuntimeError:
+            # openai есть, а httpx-aiohttp не установлен
+            pass
+    
+    http_client = DefaultAsyncHttpxClient(limits=OPENAI_HTTP_LIMITS, http2=HTTP2_AVAILABLE)
+    return AsyncOpenAI(api_key=api_key, http_client=http_client, **kwargs)
+
+
+def has_cyrillic(text: str) -> bool:
+    """Проверяет есть ли в тексте кириллица (признак непереведенной записи)"""
+    return _CYRILLIC_RE.search(text) is not None
+
 
 class SubtitleEntry:
     """Класс для работы с одной записью субтитра"""
     
+    # Без __dict__ у каждого экземпляра - на длинных видео записей тысячи
+    __slots__ = ('index', 'start_time', 'end_time', 'text')
+    
     def __init__(self, index, start_time: str, end_time: str, text: str):
         self.index = index  # Может быть int или str (для суб-индексов)
         self.start_time = start_time
@@ -116,100 +265,257 @@ class SubtitleEntry:
         return f"{self.index}\n{self.start_time} --> {self.end_time}\n{self.text}\n"
 
 
+def run_ffmpeg(cmd: List[str]) -> None:
+    """
+    Запускает ffmpeg и читает его stderr потоково через буфер 1MB
+    Хранит только последние FFMPEG_STDERR_TAIL_LINES строк для сообщения об ошибке,
+    чтобы лог долгого кодирования не копился в памяти целиком
+    При ошибке бросает CalledProcessError с хвостом stderr
+    """
+    stderr_tail = collections.deque(maxlen=FFMPEG_STDERR_TAIL_LINES)
+    
+    # stdout не нужен, поэтому читать stderr в основном потоке безопасно - дедлока не будет
+    # stdin закрыт: ffmpeg не ждет ввода с терминала (и не останавливается по SIGTTIN в фоне)
+    with subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                          stderr=subprocess.PIPE, bufsize=1 << 20) as process:
+        for line in process.stderr:
+            stderr_tail.append(line)
+        returncode = process.wait()
+    
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, cmd, stderr=b''.join(stderr_tail))
+
+
+@functools.lru_cache(maxsize=None)
+def detect_video_encoder(ffmpeg_path: str) -> str:
+    """
+    Выбирает кодировщик H.264 для вшивания субтитров (результат кэшируется на весь запуск)
+    При VIDEO_ENCODER=auto перебирает аппаратные из VIDEO_ENCODER_ARGS, которые есть в сборке ffmpeg,
+    и берет первый, прошедший пробное кодирование одного кадра: наличие в списке не гарантирует
+    наличие устройства (NVENC в сборке, но нет GPU / драйвера)
+    Если burn_subtitles все же упадет на выбранном - он откатывается на libx264
+    """
+    if VIDEO_ENCODER != 'auto':
+        return VIDEO_ENCODER
+    
+    try:
+        result = subprocess.run([ffmpeg_path, '-hide_banner', '-encoders'], stdin=subprocess.DEVNULL,
+                                capture_output=True, text=True, timeout=30)
+    except (OSError, subprocess.SubprocessError):
+        return 'libx264'
+    
+    # Строки вида " V....D h264_nvenc           NVIDIA NVENC H.264 encoder"
+    available = {fields[1] for fields in map(str.split, result.stdout.splitlines()) if len(fields) > 1}
+    for encoder in VIDEO_ENCODER_ARGS:
+        if encoder == 'libx264' or encoder not in available:
+            continue
+        # Один черный кадр 256x256 (минимальный размер для NVENC/AMF) в никуда - секунды на проверку
+        probe_cmd = [
+            ffmpeg_path, '-hide_banner', '-nostats', '-loglevel', 'error',
+            '-f', 'lavfi', '-i', 'color=black:s=256x256:d=0.1',
+            '-frames:v', '1', '-c:v', encoder, *VIDEO_ENCODER_ARGS[encoder],
+            '-f', 'null', '-'
+        ]
+        try:
+            probe = subprocess.run(probe_cmd, stdin=subprocess.DEVNULL, capture_output=True, timeout=30)
+        except (OSError, subprocess.SubprocessError):
+            continue
+        if probe.returncode == 0:
+            return encoder
+        print(f"   ℹ️  Кодировщик {encoder} есть в ffmpeg, но не работает на этой машине - пробую следующий", flush=True)
+    return 'libx264'
+
+
 def get_audio_duration(audio_path: str) -> float:
-    """Получает длительность аудио в секундах"""
+    """
+    Получает длительность аудио в секундах
+    Результат кэшируется по (путь, время изменения, размер) - повторный вызов для того же файла без ffprobe
+    """
+    return _probe_media_file(audio_path)[0]
+
+
+def copyable_audio_kbps(video_path: str) -> int:
+    """
+    Битрейт (kbps) первой аудиодорожки, если ее можно резать на части без перекодирования:
+    mp3 не выше AUDIO_COPY_MAX_KBPS. Иначе 0 - дорожку нужно перекодировать
+    Берется из того же (кэшированного) вызова ffprobe, что и длительность
+    """
+    _, codec, bit_rate = _probe_media_file(video_path)
+    kbps = math.ceil(bit_rate / 1000)
+    if codec == 'mp3' and 0 < kbps <= AUDIO_COPY_MAX_KBPS:
+        return kbps
+    return 0
+
+
+def _probe_media_file(path: str) -> Tuple[float, str, int]:
+    """(длительность в секундах, кодек первой аудиодорожки, ее битрейт в bit/s) - с кэшем по stat файла"""
+    stat = os.stat(path)
+    return _probe_media(path, stat.st_mtime_ns, stat.st_size)
+
+
+@functools.lru_cache(maxsize=256)
+def _probe_media(path: str, mtime_ns: int, size: int) -> Tuple[float, str, int]:
+    """Запускает ffprobe один раз на файл; mtime_ns и size нужны только как часть ключа кэша"""
     cmd = [
-        FFPROBE_PATH, '-i', audio_path,
-        '-show_entries', 'format=duration',
+        FFPROBE_PATH, '-i', path,
+        '-select_streams', 'a:0',
+        '-show_entries', 'format=duration:stream=codec_name,bit_rate',
         '-v', 'quiet',
-        '-of', 'csv=p=0'
+        '-of', 'json'
     ]
-    result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-    return float(result.stdout.strip())
+    # Вывод - пара строк JSON, буфер по умолчанию хватает; stdin закрыт, как и у ffmpeg
+    result = subprocess.run(cmd, stdin=subprocess.DEVNULL, capture_output=True, text=True, check=True)
+    info = json.loads(result.stdout)
+    stream = (info.get('streams') or [{}])[0]
+    bit_rate = stream.get('bit_rate', '')
+    return (
+        float(info['format']['duration']),
+        stream.get('codec_name', ''),
+        int(bit_rate) if bit_rate.isdigit() else 0
+    )
 
 
-def extract_audio(video_path: str, audio_path: str) -> None:
-    """Извлекает аудио из видео файла"""
-    print(f"📹 Извлекаю аудио из {video_path}...")
-    
-    cmd = [
-        FFMPEG_PATH, '-i', video_path,
-        '-vn',  # без видео
-        '-acodec', 'libmp3lame',  # кодек mp3
-        '-ab', '128k',  # битрейт (уменьшен до 128k для экономии размера)
-        '-ar', '44100',  # sample rate
-        '-y',  # перезаписать если существует
-        audio_path
-    ]
-    
-    try:
-        subprocess.run(cmd, check=True, capture_output=True)
-        print(f"✅ Аудио извлечено: {audio_path}")
-    except subprocess.CalledProcessError as e:
-        print(f"❌ Ошибка при извлечении аудио: {e.stderr.decode()}")
-        raise
+def pick_audio_work_dir(required_bytes: float) -> str:
+    """
+    Выбирает где держать части аудио: первый tmpfs в оперативной памяти из RAM_TEMP_DIRS,
+    в котором хватает места на всё аудио с запасом, иначе None (системная временная папка)
+    Части пишутся и читаются только в памяти - диск в пайплайне не участвует
+    """
+    for ram_dir in RAM_TEMP_DIRS:
+        if not (os.path.isdir(ram_dir) and os.access(ram_dir, os.W_OK)):
+            continue
+        # Запас в 2 раза: в последовательном режиме ffmpeg успевает нарезать все части раньше загрузки
+        if shutil.disk_usage(ram_dir).free > required_bytes * 2:
+            return ram_dir
+    return None
 
 
-def split_audio(audio_path: str, target_chunk_size_mb: float = 12.0) -> List[str]:
+def plan_audio_chunks(
+    video_path: str,
+    target_chunk_size_mb: float = 12.0,
+    bitrate_kbps: int = AUDIO_BITRATE_KBPS
+) -> Tuple[int, int]:
     """
-    Разбивает аудио на части если файл больше 24MB
-    Умно вычисляет длительность чанка на основе битрейта, чтобы каждая часть была ~12MB
+    Вычисляет длительность чанка аудио, чтобы каждая часть была не больше ~12MB (лимит Whisper API 25MB)
+    Битрейт известен заранее, поэтому нужна только длительность видео
     target_chunk_size_mb: целевой размер чанка в МБ (по умолчанию 12MB для надёжности)
-    Возвращает список путей к частям
+    bitrate_kbps: битрейт частей (AUDIO_BITRATE_KBPS или битрейт копируемой дорожки)
+    Возвращает кортеж (длительность_чанка_в_секундах, количество_чанков)
     """
-    file_size = os.path.getsize(audio_path)
-    max_size = 24 * 1024 * 1024  # 24MB (лимит API)
-    
-    print(f"📊 Размер аудио файла: {file_size / 1024 / 1024:.2f}MB")
-    
-    if file_size <= max_size:
-        print(f"✅ Файл помещается в лимит API, разбиение не требуется")
-        return [audio_path]
+    duration = get_audio_duration(video_path)
+    print(f"📊 Длительность видео: {duration / 60:.1f} минут")
     
-    print(f"⚠️  Файл большой ({file_size / 1024 / 1024:.1f}MB), разбиваю на части...")
-    
-    duration = get_audio_duration(audio_path)
-    print(f"   Длительность аудио: {duration / 60:.1f} минут")
-    
-    # Вычисляем битрейт (байт/секунда) и оптимальную длительность чанка
-    bitrate_bytes_per_sec = file_size / duration
+    # Битрейт (байт/секунда) и оптимальная длительность чанка
+    bitrate_bytes_per_sec = bitrate_kbps * 1000 / 8
     target_chunk_bytes = target_chunk_size_mb * 1024 * 1024
     chunk_duration = int(target_chunk_bytes / bitrate_bytes_per_sec)
     
     # Минимум 5 минут, максимум 15 минут на чанк
     chunk_duration = max(300, min(chunk_duration, 900))
     
-    print(f"   Битрейт: {bitrate_bytes_per_sec * 8 / 1000:.0f} kbps")
-    print(f"   Оптимальная длительность чанка: {chunk_duration / 60:.1f} минут (~{chunk_duration * bitrate_bytes_per_sec / 1024 / 1024:.1f}MB)")
-    print(f"   💡 Меньшие чанки = более надёжная обработка в Whisper API", flush=True)
+    num_chunks = max(1, math.ceil(duration / chunk_duration))
     
-    chunks = []
-    base_path = audio_path.rsplit('.', 1)[0]
-    extension = audio_path.rsplit('.', 1)[1]
+    print(f"   Длительность чанка: {chunk_duration / 60:.1f} минут (~{chunk_duration * bitrate_bytes_per_sec / 1024 / 1024:.1f}MB при {bitrate_kbps} kbps)")
+    print(f"   Будет создано {num_chunks} частей", flush=True)
     
-    num_chunks = int(duration / chunk_duration) + (1 if duration % chunk_duration > 0 else 0)
-    print(f"   Будет создано {num_chunks} частей")
+    return (chunk_duration, num_chunks)
+
+
+async def extract_audio_chunks_async(
+    video_path: str,
+    output_prefix: str,
+    chunk_duration: int,
+    queue: asyncio.Queue,
+    copy_audio: bool = False
+) -> None:
+    """
+    Извлекает аудио из видео и сразу режет его на части - один проход ffmpeg (segment muxer),
+    без промежуточного полного mp3 файла
+    Кладёт в очередь (номер_чанка, путь) как только часть полностью записана,
+    чтобы транскрипция первых частей начиналась не дожидаясь конца извлечения
+    О готовности части ffmpeg сообщает сам (segment_list в stdout) - без опроса папки
+    copy_audio: дорожка уже mp3 с подходящим битрейтом - режем без перекодирования
+    В конце кладёт None
+    """
+    print(f"📹 Извлекаю аудио из {video_path}...", flush=True)
+    
+    extension = 'mp3'
+    parts_dir = os.path.dirname(output_prefix)
+    parts_pattern = f"{glob.escape(output_prefix)}_part[0-9][0-9][0-9].{extension}"
+    
+    cmd = [
+        FFMPEG_PATH,
+        '-nostdin',  # не опрашивать клавиатуру - процесс фоновый
+        '-hide_banner', '-nostats',  # stderr только для предупреждений и ошибок, без строк прогресса
+        '-i', video_path,
+        '-map', '0:a:0',  # только первая аудиодорожка
+        '-vn',  # без видео
+        *(['-c:a', 'copy'] if copy_audio else [
+            '-acodec', 'libmp3lame',  # кодек mp3
+            '-ab', f'{AUDIO_BITRATE_KBPS}k',  # битрейт (64k моно достаточно для распознавания речи)
+            '-ac', '1',  # моно
+            '-ar', str(AUDIO_SAMPLE_RATE),  # 16kHz - частота, с которой работает Whisper
+        ]),
+        '-map_metadata', '-1',  # теги исходника не копируем в каждую часть
+        '-f', 'segment',  # сразу режем на части
+        '-segment_time', str(chunk_duration),
+        '-reset_timestamps', '1',
+        '-segment_list', 'pipe:1',  # имя каждой дописанной части - строкой в stdout
+        '-segment_list_type', 'flat',
+        '-y',  # перезаписать если существует
+        f"{output_prefix}_part%03d.{extension}"
+    ]
     
-    for i in range(num_chunks):
-        start_time = i * chunk_duration
-        chunk_path = f"{base_path}_part{i+1}.{extension}"
+    try:
+        process = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            limit=1 << 20
+        )
         
-        cmd = [
-            FFMPEG_PATH, '-i', audio_path,
-            '-ss', str(start_time),
-            '-t', str(chunk_duration),
-            '-acodec', 'copy',
-            '-y',
-            chunk_path
-        ]
+        # Читаем stderr параллельно, чтобы ffmpeg не заблокировался на полном пайпе
+        # (храним только хвост для сообщения об ошибке)
+        stderr_tail = collections.deque(maxlen=FFMPEG_STDERR_TAIL_LINES)
         
-        subprocess.run(cmd, check=True, capture_output=True)
+        async def drain_stderr():
+            async for line in process.stderr:
+                stderr_tail.append(line)
         
-        chunk_size = os.path.getsize(chunk_path)
-        chunks.append(chunk_path)
-        print(f"   ✅ Создана часть {i+1}/{num_chunks}: {chunk_size / 1024 / 1024:.1f}MB")
-    
-    return chunks
+        stderr_task = asyncio.create_task(drain_stderr())
+        
+        emitted = set()
+        
+        async def emit(chunk_path: str):
+            if chunk_path in emitted:
+                return
+            emitted.add(chunk_path)
+            chunk_num = int(chunk_path[-len(extension) - 4:-len(extension) - 1]) + 1
+            chunk_size = os.path.getsize(chunk_path)
+            print(f"   ✅ Создана часть {chunk_num}: {chunk_size / 1024 / 1024:.1f}MB", flush=True)
+            await queue.put((chunk_num, chunk_path))
+        
+        # ffmpeg пишет имя части в segment_list только когда она полностью закрыта
+        async for line in process.stdout:
+            name = line.decode(errors='replace').strip()
+            if name:
+                await emit(os.path.join(parts_dir, name))
+        
+        await process.wait()
+        
+        # Страховка: части, о которых ffmpeg не сообщил (имена %03d сортируются по порядку)
+        if process.returncode == 0:
+            for chunk_path in sorted(glob.glob(parts_pattern)):
+                await emit(chunk_path)
+        
+        await stderr_task
+        if process.returncode != 0:
+            stderr = b''.join(stderr_tail)
+            print(f"❌ Ошибка при извлечении аудио: {stderr.decode(errors='replace')}", flush=True)
+            raise subprocess.CalledProcessError(process.returncode, cmd, stderr=stderr)
+    finally:
+        await queue.put(None)
 
 
 def split_long_subtitle_text(text: str, max_chars_per_line: int = 45) -> str:
@@ -244,141 +550,270 @@ def split_long_subtitle_text(text: str, max_chars_per_line: int = 45) -> str:
     return '\n'.join(lines)
 
 
-def split_subtitle_entry(entry: SubtitleEntry, max_lines: int = 2) -> List[SubtitleEntry]:
+def count_wrapped_lines(words: List[str], max_chars_per_line: int = 45) -> int:
+    """Сколько строк получится у split_long_subtitle_text из этих слов - без сборки самих строк"""
+    lines = 0
+    current_length = 0
+    for word in words:
+        if lines and current_length + 1 + len(word) <= max_chars_per_line:
+            current_length += 1 + len(word)
+        else:
+            lines += 1
+            current_length = len(word)
+    return lines
+
+
+def parse_srt_time(time_str: str) -> int:
+    """Конвертирует HH:MM:SS,mmm в миллисекунды"""
+    h, m, s_ms = time_str.split(':')
+    s, ms = s_ms.split(',')
+    return ((int(h) * 60 + int(m)) * 60 + int(s)) * 1000 + int(ms)
+
+
+def format_srt_time(total_ms: int) -> str:
+    """Конвертирует миллисекунды в HH:MM:SS,mmm"""
+    h, rest = divmod(total_ms, 3600000)
+    m, rest = divmod(rest, 60000)
+    s, ms = divmod(rest, 1000)
+    return f"{h:02d}:{m:02d}:{s:02d},{ms:03d}"
+
+
+def _split_words_by_time(
+    words: List[str],
+    start_ms: int,
+    end_ms: int,
+    max_lines: int,
+    parts: List[Tuple[str, int, int]]
+) -> None:
     """
-    РЕКУРСИВНАЯ разбивка: делим текст ПОПОЛАМ по словам, время ПРОПОРЦИОНАЛЬНО
-    Продолжаем делить пока все части не будут <= max_lines строк
+    РЕКУРСИВНАЯ разбивка по списку слов: делим ПОПОЛАМ по словам, время ПРОПОРЦИОНАЛЬНО,
+    пока каждая часть не уложится в max_lines строк; половины не склеиваются в строки на каждом уровне,
+    текст собирается один раз - только для готовых частей
+    Готовые части дописываются по порядку в общий список parts (без промежуточных списков на каждом уровне)
     """
-    # Вспомогательные функции для работы со временем
-    def parse_time(time_str: str) -> float:
-        """Конвертирует HH:MM:SS,mmm в секунды"""
-        time_part = time_str.replace(',', '.')
-        h, m, s = time_part.split(':')
-        return int(h) * 3600 + int(m) * 60 + float(s)
+    # Делим слова ПОПОЛАМ
+    mid = len(words) // 2
+    halves = (words[:mid], words[mid:])
     
-    def format_time(seconds: float) -> str:
-        """Конвертирует секунды в HH:MM:SS,mmm"""
-        h = int(seconds // 3600)
-        m = int((seconds % 3600) // 60)
-        s = seconds % 60
-        return f"{h:02d}:{m:02d}:{s:06.3f}".replace('.', ',')
+    # Время пропорционально длине текста (длина ' '.join без самой склейки; целочисленно, без float)
+    first_len, second_len = (sum(map(len, half)) + len(half) - 1 for half in halves)
+    split_ms = start_ms + (end_ms - start_ms) * first_len // (first_len + second_len)
     
+    # РЕКУРСИВНО обрабатываем каждую половину, пока она не уложится в max_lines строк
+    for half, half_start, half_end in ((halves[0], start_ms, split_ms), (halves[1], split_ms, end_ms)):
+        if len(half) < 2 or count_wrapped_lines(half) <= max_lines:
+            parts.append((split_long_subtitle_text(' '.join(half)), half_start, half_end))
+        else:
+            _split_words_by_time(half, half_start, half_end, max_lines, parts)
+
+
+def split_subtitle_entry(entry: SubtitleEntry, max_lines: int = 2) -> List[SubtitleEntry]:
+    """
+    Разбивает длинный субтитр (> max_lines строк) на несколько записей
+    Индексы частей: 173, 173_1, 173_2...
+    """
     # Форматируем текст (разбивка на строки по 45 символов)
     text_with_lines = split_long_subtitle_text(entry.text)
-    lines = text_with_lines.split('\n')
     
-    # Если <= 2 строк - возвращаем как есть
-    if len(lines) <= max_lines:
+    # Если <= 2 строк - возвращаем как есть (тайминги даже не парсим)
+    if text_with_lines.count('\n') < max_lines:
         entry.text = text_with_lines
         return [entry]
     
-    # Если > 2 строк - делим ПОПОЛАМ (слова + время)
+    # Одно слово не делится - оставляем как есть
     words = entry.text.split()
-    
-    # Защита от бесконечной рекурсии: если слов слишком мало
     if len(words) < 2:
         entry.text = text_with_lines
         return [entry]
     
-    # Делим слова ПОПОЛАМ
-    mid = len(words) // 2
-    first_half_words = words[:mid]
-    second_half_words = words[mid:]
-    
-    # Создаем текст для каждой половины
-    first_text = ' '.join(first_half_words)
-    second_text = ' '.join(second_half_words)
-    
-    # Вычисляем время пропорционально длине текста
-    start_sec = parse_time(entry.start_time)
-    end_sec = parse_time(entry.end_time)
-    duration = end_sec - start_sec
-    
-    first_len = len(first_text)
-    second_len = len(second_text)
-    total_len = first_len + second_len
-    
-    # Защита от деления на ноль
-    if total_len == 0:
-        entry.text = text_with_lines
-        return [entry]
-    
-    # Время пропорционально длине текста
-    first_duration = duration * (first_len / total_len)
-    split_time = start_sec + first_duration
-    
-    # Создаем две половины
-    first_entry = SubtitleEntry(
-        index=entry.index,
-        start_time=entry.start_time,
-        end_time=format_time(split_time),
-        text=first_text
-    )
-    
-    second_entry = SubtitleEntry(
-        index=f"{entry.index}_1",
-        start_time=format_time(split_time),
-        end_time=entry.end_time,
-        text=second_text
-    )
-    
-    # РЕКУРСИВНО обрабатываем каждую половину
-    first_parts = split_subtitle_entry(first_entry, max_lines)
-    second_parts = split_subtitle_entry(second_entry, max_lines)
-    
-    # Перенумеровываем индексы во второй половине
-    # Если первая половина разбилась на N частей, вторая начинается с index_N
-    if len(first_parts) > 1 or len(second_parts) > 1:
-        # Обновляем индексы во второй части
-        for i, part in enumerate(second_parts):
-            if i == 0:
-                part.index = f"{entry.index}_{len(first_parts)}"
-            else:
-                part.index = f"{entry.index}_{len(first_parts) + i}"
-    
-    # Объединяем результаты
-    return first_parts + second_parts
+    # Текст уже разбит на строки выше - сразу в рекурсию по словам, без повторной разбивки
+    # Тайминги парсим один раз на запись, рекурсия работает с миллисекундами
+    parts = []
+    _split_words_by_time(words, parse_srt_time(entry.start_time), parse_srt_time(entry.end_time), max_lines, parts)
+    
+    return [
+        SubtitleEntry(
+            index=entry.index if i == 0 else f"{entry.index}_{i}",
+            start_time=format_srt_time(start_ms),
+            end_time=format_srt_time(end_ms),
+            text=text
+        )
+        for i, (text, start_ms, end_ms) in enumerate(parts)
+    ]
 
 
-def format_timestamp(seconds: float) -> str:
-    """Конвертирует секунды в формат SRT (HH:MM:SS,mmm)"""
-    hours = int(seconds // 3600)
-    minutes = int((seconds % 3600) // 60)
-    secs = int(seconds % 60)
-    millis = int((seconds % 1) * 1000)
-    return f"{hours:02d}:{minutes:02d}:{secs:02d},{millis:03d}"
+def split_long_entries(entries: List[SubtitleEntry], max_lines: int = 2) -> List[SubtitleEntry]:
+    """
+    POST-PROCESSING: разбивает длинные субтитры (> max_lines строк) на части
+    Делим слова пополам + время пропорционально (рекурсивно пока <= max_lines строк)
+    """
+    final_entries = []
+    for entry in entries:
+        final_entries.extend(split_subtitle_entry(entry, max_lines))
+    return final_entries
+
+
+def file_content_hash(path: str, block_size: int = 1 << 20) -> str:
+    """blake2b (16 байт, hex) содержимого файла - читаем блоками, целиком в память не грузим"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
 
+def chunk_cache_name(chunk_hash: str) -> str:
+    """Имя файла кэша с сырым SRT чанка (без смещения таймингов)"""
+    return f"chunk_{chunk_hash}.srt"
 
-def transcribe_audio_chunk(audio_path: str, client: OpenAI, offset: float = 0) -> str:
+
+def video_fingerprint(video_path: str) -> dict:
+    """Размер и время изменения видео - по ним манифест чанков относится именно к этому файлу"""
+    stat = os.stat(video_path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def load_chunk_manifest(cache_dir: str, video_path: str) -> dict:
     """
-    Транскрибирует один файл аудио через Whisper API (синхронно)
-    offset: смещение времени для корректировки таймингов (в секундах)
-    Возвращает SRT контент
+    Читает манифест чанков из cache_dir
+    Возвращает пустой словарь если манифеста нет, он поврежден или записан для другой версии видео
+    """
+    try:
+        with open(os.path.join(cache_dir, CHUNK_MANIFEST_NAME), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(manifest, dict) or manifest.get('video') != video_fingerprint(video_path):
+        return {}
+    return manifest
+
+
+def save_chunk_manifest(cache_dir: str, manifest: dict) -> None:
+    """Атомарно записывает манифест (tmp + os.replace) - прерванный запуск не оставит битый файл"""
+    manifest_path = os.path.join(cache_dir, CHUNK_MANIFEST_NAME)
+    tmp_path = manifest_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, manifest_path)
+
+
+def load_manifest_transcripts(cache_dir: str, manifest: dict) -> List[Tuple[int, str]]:
+    """
+    Если по манифесту готовы все чанки и их SRT есть в кэше - возвращает [(номер_чанка, SRT)]
+    со смещением таймингов, как после транскрипции; иначе None (нужно извлекать аудио)
+    """
+    chunks = manifest.get('chunks', {})
+    total_chunks = manifest.get('total_chunks')
+    if not total_chunks:
+        return None
+    
+    results = []
+    for chunk_num in range(1, total_chunks + 1):
+        chunk = chunks.get(str(chunk_num))
+        if not chunk or chunk.get('status') != 'done':
+            return None
+        try:
+            with open(os.path.join(cache_dir, chunk['srt_file']), 'r', encoding='utf-8') as f:
+                transcript = f.read()
+        except OSError:
+            return None
+        if chunk['offset'] > 0:
+            transcript = adjust_srt_timings(transcript, offset_seconds=chunk['offset'], index_offset=0)
+        results.append((chunk_num, drop_repeated_cues(transcript)))
+    return results
+
+
+class RequestRateLimiter:
+    """
+    Token bucket: не больше requests_per_minute запросов в минуту, до burst запросов подряд без ожидания
+    Запрос уходит как только в корзине есть токен - без фиксированных пауз между запросами
     """
-    file_size = os.path.getsize(audio_path)
-    duration_minutes = get_audio_duration(audio_path) / 60
-    estimated_time = duration_minutes * 0.3  # Примерно 18 секунд на минуту аудио
-    
-    print(f"   📤 Отправляю файл ({file_size / 1024 / 1024:.2f}MB, ~{duration_minutes:.1f} мин) в Whisper API...", flush=True)
-    print(f"   ⏳ Ожидаемое время обработки: ~{estimated_time:.0f} секунд...", flush=True)
-    print(f"   💡 Пожалуйста, подождите, Whisper обрабатывает аудио...", flush=True)
-    
-    with open(audio_path, 'rb') as audio_file:
-        transcript = client.audio.transcriptions.create(
-            model="whisper-1",
-            file=audio_file,
-            response_format="srt",  # Классический SRT!
-            language="ru",
-            timeout=600.0  # 10 минут максимум
-        )
-    
-    print(f"   ✅ Получен ответ от Whisper API", flush=True)
     
-    # Корректируем тайминги если есть смещение
-    if offset > 0:
-        transcript = adjust_srt_timings(transcript, offset_seconds=offset, index_offset=0)
+    def __init__(self, requests_per_minute: float, burst: int = 1):
+        self.rate = requests_per_minute / 60.0
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated_at = None
+        self.lock = asyncio.Lock()
+    
+    async def acquire(self) -> None:
+        """Ждет свободный токен и забирает его"""
+        async with self.lock:
+            loop = asyncio.get_running_loop()
+            now = loop.time()
+            if self.updated_at is not None:
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            if self.tokens < 1:
+                # Ждем под локом: следующие запросы встают в очередь за этим
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self.tokens = 1.0
+                self.updated_at = loop.time()
+            self.tokens -= 1
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    AIMD-ограничитель одновременных запросов: после каждого успешного запроса лимит растет на 1/лимит
+    (примерно +1 за "волну" запросов), при 429 - падает вдвое, в пределах [min_limit, max_limit]
+    Используется как `async with limiter:` вместо asyncio.Semaphore
+    """
     
-    return transcript
+    # Один 429 от пачки одновременных запросов - это одна перегрузка, а не несколько
+    DECREASE_INTERVAL_SECONDS = 1.0
+    
+    def __init__(self, max_limit: int, min_limit: int = 1):
+        self.max_limit = max(1, max_limit)
+        self.min_limit = min(min_limit, self.max_limit)
+        self.limit = float(self.max_limit)
+        self.in_flight = 0
+        self.decreased_at = None
+        self.condition = asyncio.Condition()
+    
+    async def __aenter__(self):
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+        return self
+    
+    async def __aexit__(self, *exc_info):
+        async with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+    
+    def on_success(self) -> None:
+        """Аддитивный рост: новые слоты откроются при выходе текущих запросов"""
+        self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+    
+    def on_rate_limited(self) -> None:
+        """Мультипликативное снижение (не чаще раза в DECREASE_INTERVAL_SECONDS)"""
+        now = asyncio.get_running_loop().time()
+        if self.decreased_at is not None and now - self.decreased_at < self.DECREASE_INTERVAL_SECONDS:
+            return
+        self.decreased_at = now
+        previous = int(self.limit)
+        self.limit = max(self.min_limit, self.limit / 2)
+        if int(self.limit) < previous:
+            print(f"   🐢 Лимит запросов OpenAI: одновременно не больше {int(self.limit)} (было {previous})", flush=True)
+
+
+def retry_after_seconds(error: Exception) -> float:
+    """Пауза из заголовка Retry-After ответа API (секунды), None если заголовка нет"""
+    response = getattr(error, 'response', None)
+    if response is None:
+        return None
+    try:
+        return max(0.0, float(response.headers.get('retry-after')))
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(error: Exception, attempt: int, base_seconds: float = 1.0, max_seconds: float = 30.0) -> float:
+    """
+    Пауза перед повтором запроса к OpenAI после attempt-й неудачной попытки
+    Сервер сам говорит сколько ждать (Retry-After) - иначе экспоненциальная пауза с джиттером до max_seconds
+    """
+    return retry_after_seconds(error) or min(max_seconds, base_seconds * 2.0 ** (attempt - 1)) * random.uniform(0.5, 1.5)
 
 
 async def transcribe_audio_chunk_async(
@@ -387,22 +822,34 @@ async def transcribe_audio_chunk_async(
     total_chunks: int,
     async_client: AsyncOpenAI, 
     offset: float = 0,
-    cache_dir: str = None
+    cache_dir: str = None,
+    prompt: str = None,
+    rate_limiter: 'RequestRateLimiter' = None,
+    bitrate_kbps: int = AUDIO_BITRATE_KBPS,
+    chunk_hash: str = None
 ) -> Tuple[int, str]:
     """
     Асинхронно транскрибирует один файл аудио через Whisper API
-    Кэширует результат для быстрого повторного использования
+    Кэширует результат по хэшу содержимого чанка: тот же звук не транскрибируется повторно,
+    даже если изменились границы или номера чанков
+    prompt: хвост текста предыдущего чанка - контекст для Whisper (термины, имена, стиль)
+    rate_limiter: общий ограничитель частоты запросов (кэшированные чанки его не расходуют)
+    bitrate_kbps: битрейт части - для оценки длительности по размеру файла
+    chunk_hash: уже посчитанный file_content_hash части (чтобы не хэшировать повторно)
     Возвращает кортеж (номер_чанка, SRT_контент)
     """
     import time
     start_time = time.time()
     
-    # Проверяем кэш если указан cache_dir
+    # Проверяем кэш если указан cache_dir (ключ - хэш байтов чанка, а не его номер)
     cache_file = None
     if cache_dir:
-        cache_file = os.path.join(cache_dir, f"chunk_{chunk_num}_raw.srt")
+        if chunk_hash is None:
+            # Хэшируем блоками в отдельном потоке - не блокируем event loop и не держим чанк в памяти
+            chunk_hash = await asyncio.to_thread(file_content_hash, audio_path)
+        cache_file = os.path.join(cache_dir, chunk_cache_name(chunk_hash))
         if os.path.exists(cache_file):
-            print(f"   💾 Чанк {chunk_num}/{total_chunks}: загружаю из кэша {cache_file}", flush=True)
+            print(f"   💾 Чанк {chunk_num}/{total_chunks}: загружаю из кэша {cache_file}")
             with open(cache_file, 'r', encoding='utf-8') as f:
                 transcript = f.read()
             
@@ -410,48 +857,67 @@ async def transcribe_audio_chunk_async(
             if offset > 0:
                 transcript = adjust_srt_timings(transcript, offset_seconds=offset, index_offset=0)
             
-            print(f"   ✅ Чанк {chunk_num} загружен из кэша мгновенно!", flush=True)
+            print(f"   ✅ Чанк {chunk_num} загружен из кэша мгновенно!")
             return (chunk_num, transcript)
     
     file_size = os.path.getsize(audio_path)
-    duration_minutes = get_audio_duration(audio_path) / 60
+    # Длительность для оценки времени считаем из размера: битрейт постоянный (CBR), ffprobe не нужен
+    duration_minutes = file_size / (bitrate_kbps * 1000 / 8) / 60
     estimated_time = duration_minutes * 0.3
     
-    print(f"   📤 Чанк {chunk_num}/{total_chunks}: отправляю {file_size / 1024 / 1024:.2f}MB (~{duration_minutes:.1f} мин) в Whisper API...", flush=True)
-    print(f"      ⏳ Ожидаемое время: ~{estimated_time:.0f} сек", flush=True)
+    print(f"   📤 Чанк {chunk_num}/{total_chunks}: отправляю {file_size / 1024 / 1024:.2f}MB (~{duration_minutes:.1f} мин) в Whisper API...")
+    print(f"      ⏳ Ожидаемое время: ~{estimated_time:.0f} сек")
     
     try:
-        # Читаем файл
-        with open(audio_path, 'rb') as audio_file:
-            file_content = audio_file.read()
+        # Хвост предыдущего чанка продолжает контекст на стыке частей
+        extra_params = {"prompt": prompt} if prompt else {}
         
-        # Создаем file-like объект для async API
-        from io import BytesIO
-        audio_file_obj = BytesIO(file_content)
-        audio_file_obj.name = os.path.basename(audio_path)
+        # Повторы SDK выключены: единственная политика повторов - цикл ниже
+        # (иначе каждая попытка - до 3 загрузок чанка, и паузы SDK мимо rate_limiter)
+        whisper_client = async_client.with_options(max_retries=0)
         
         # Оборачиваем в asyncio.wait_for для контроля таймаута
         async def do_transcription():
-            return await async_client.audio.transcriptions.create(
-                model="whisper-1",
-                file=audio_file_obj,
-                response_format="srt",
-                language="ru",
-                timeout=1200.0
-            )
+            # Отдаем открытый файл: multipart-тело читается блоками во время отправки,
+            # а не копией всего чанка в памяти (имя нужно API для определения формата)
+            with open(audio_path, 'rb') as audio_file:
+                return await whisper_client.audio.transcriptions.create(
+                    model="whisper-1",
+                    file=(os.path.basename(audio_path), audio_file, 'audio/mpeg'),
+                    response_format="srt",
+                    language="ru",
+                    timeout=1200.0,
+                    **extra_params
+                )
         
-        # Ждем с таймаутом 25 минут (максимум для чанка)
-        transcript = await asyncio.wait_for(do_transcription(), timeout=1500.0)
+        for attempt in range(1, OPENAI_MAX_ATTEMPTS + 1):
+            if rate_limiter:
+                await rate_limiter.acquire()
+            try:
+                # Ждем с таймаутом 25 минут (максимум для чанка)
+                transcript = await asyncio.wait_for(do_transcription(), timeout=1500.0)
+                break
+            except OPENAI_TRANSIENT_ERRORS as e:
+                # 429, обрыв соединения или 5xx - повторяем только этот чанк, а не всю транскрипцию
+                if attempt == OPENAI_MAX_ATTEMPTS:
+                    raise
+                delay = backoff_delay(e, attempt, base_seconds=5.0, max_seconds=60.0)
+                print(f"   ⏳ Чанк {chunk_num}: {type(e).__name__} от Whisper API, повтор {attempt}/{OPENAI_MAX_ATTEMPTS - 1} через {delay:.1f} сек...", flush=True)
+                await asyncio.sleep(delay)
         
         elapsed_time = time.time() - start_time
-        print(f"   ✅ Чанк {chunk_num}/{total_chunks} завершен успешно за {elapsed_time:.0f} сек!", flush=True)
+        print(f"   ✅ Чанк {chunk_num}/{total_chunks} завершен успешно за {elapsed_time:.0f} сек!")
         
         # СОХРАНЯЕМ В КЭШ перед корректировкой (сохраняем raw без offset)
         if cache_file:
             os.makedirs(cache_dir, exist_ok=True)
-            with open(cache_file, 'w', encoding='utf-8') as f:
+            # Через tmp + rename: кэш ищется по хэшу звука, и обрезанный при обрыве файл
+            # считался бы готовой транскрипцией при каждом следующем запуске
+            tmp_cache_file = f"{cache_file}.tmp"
+            with open(tmp_cache_file, 'w', encoding='utf-8') as f:
                 f.write(transcript)
-            print(f"   💾 Чанк {chunk_num} сохранен в кэш: {cache_file}", flush=True)
+            os.replace(tmp_cache_file, cache_file)
+            print(f"   💾 Чанк {chunk_num} сохранен в кэш: {cache_file}")
         
         # Корректируем тайминги если есть смещение (индексы перенумеруем позже при объединении)
         if offset > 0:
@@ -473,261 +939,357 @@ def adjust_srt_timings(srt_content: str, offset_seconds: float, index_offset: in
     Добавляет смещение ко всем таймингам в SRT и перенумеровывает индексы
     offset_seconds: смещение времени в секундах
     index_offset: смещение для индексов субтитров (для правильной нумерации при склейке)
+    Нулевое смещение пропускает свой проход целиком (при склейке чанков - только перенумерация)
     """
-    from datetime import timedelta
+    # Целые миллисекунды - без ошибок округления float
+    offset_ms = int(round(offset_seconds * 1000))
     
-    def add_offset(time_str: str) -> str:
-        # Парсим время в формате HH:MM:SS,mmm
-        h, m, s_ms = time_str.split(':')
-        s, ms = s_ms.split(',')
-        
-        # Более точная конвертация с float
-        total_seconds = float(h) * 3600 + float(m) * 60 + float(s) + float(ms) / 1000.0
-        total_seconds += offset_seconds
-        
-        # Разбиваем на компоненты с правильным округлением
-        hours = int(total_seconds // 3600)
-        minutes = int((total_seconds % 3600) // 60)
-        seconds = total_seconds % 60
-        secs = int(seconds)
-        milliseconds = int(round((seconds - secs) * 1000))
-        
-        # Обработка случая когда миллисекунды округлились до 1000
-        if milliseconds >= 1000:
-            milliseconds = 0
-            secs += 1
-        
-        return f"{hours:02d}:{minutes:02d}:{secs:02d},{milliseconds:03d}"
+    def add_offset(match: re.Match) -> str:
+        h, m, s, ms = match.groups()
+        return format_srt_time(((int(h) * 60 + int(m)) * 60 + int(s)) * 1000 + int(ms) + offset_ms)
+    
+    def add_index_offset(match: re.Match) -> str:
+        return str(int(match.group(1)) + index_offset)
+    
+    # Одна замена по всему тексту вместо разбора каждой строки
+    if offset_ms:
+        srt_content = _SRT_TIMESTAMP_RE.sub(add_offset, srt_content)
+    if index_offset:
+        srt_content = _SRT_INDEX_LINE_RE.sub(add_index_offset, srt_content)
+    
+    return srt_content
+
+
+def srt_text_tail(srt_content: str, max_chars: int = WHISPER_PROMPT_CHARS) -> str:
+    """
+    Возвращает последние max_chars символов текста субтитров (без индексов и таймингов)
+    Используется как prompt для Whisper при транскрипции следующего чанка
+    """
+    text_lines = []
+    for block in srt_content.strip().split('\n\n')[-20:]:
+        lines = block.strip().split('\n')
+        if len(lines) >= 3:
+            text_lines.extend(line.strip() for line in lines[2:])
+    
+    tail = ' '.join(line for line in text_lines if line)[-max_chars:]
+    # Не начинаем prompt с обрезанного слова
+    if len(tail) == max_chars and ' ' in tail:
+        tail = tail.split(' ', 1)[1]
+    return tail
+
+
+def _normalize_word(word: str) -> str:
+    return word.strip('.,!?;:…«»"\'()-—').lower()
+
+
+def drop_boundary_overlap(previous_transcript: str, transcript: str, max_words: int = 8) -> str:
+    """
+    Убирает слова, повторенные на стыке чанков: если первый субтитр чанка начинается
+    с тех же слов, которыми закончился предыдущий чанк, повтор вырезается
+    Субтитр целиком не удаляется, чтобы не ломать нумерацию
+    """
+    # Нужны только последний блок предыдущего чанка и первый блок этого -
+    # отрезаем их одним разрезом, не раскладывая весь чанк на блоки
+    previous_lines = previous_transcript.strip().rsplit('\n\n', 1)[-1].strip().split('\n')
+    first_block, *rest = transcript.strip().split('\n\n', 1)
+    first_lines = first_block.strip().split('\n')
+    if len(previous_lines) < 3 or len(first_lines) < 3:
+        return transcript
+    
+    previous_words = [_normalize_word(w) for w in ' '.join(previous_lines[2:]).split()]
+    first_words = ' '.join(first_lines[2:]).split()
+    normalized_first = [_normalize_word(w) for w in first_words]
     
-    lines = srt_content.split('\n')
-    adjusted_lines = []
+    # Ищем самый длинный повтор (от 2 слов - одиночные совпадения слишком часто случайны)
+    for size in range(min(max_words, len(previous_words), len(first_words) - 1), 1, -1):
+        if previous_words[-size:] == normalized_first[:size]:
+            first_lines = first_lines[:2] + [' '.join(first_words[size:])]
+            return '\n\n'.join(['\n'.join(first_lines), *rest])
     
-    for line in lines:
-        line_stripped = line.strip()
+    return transcript
+
+
+def last_srt_index(srt_content: str) -> int:
+    """
+    Возвращает индекс последнего субтитра в SRT (0 если субтитров нет)
+    Читает только хвост текста, а не весь SRT
+    """
+    tail = srt_content[-4096:]
+    matches = _SRT_INDEX_LINE_RE.findall(tail)
+    if not matches and len(srt_content) > len(tail):
+        # Последний блок длиннее хвоста (очень длинный текст) - ищем по всему SRT
+        matches = _SRT_INDEX_LINE_RE.findall(srt_content)
+    return int(matches[-1]) if matches else 0
+
+
+def combine_chunk_transcripts(results: List[Tuple[int, str]]) -> Tuple[str, int]:
+    """
+    Объединяет SRT чанков в один с правильной нумерацией субтитров
+    results: список (номер_чанка, SRT_контент), тайминги уже скорректированы
+    Возвращает кортеж (SRT_контент, количество_субтитров)
+    """
+    # Сортируем по номеру чанка
+    results = sorted(results, key=lambda x: x[0])
+    
+    all_transcripts = []
+    index_offset = 0
+    previous_transcript = None
+    
+    for chunk_num, transcript in results:
+        # Убираем повтор слов на стыке с предыдущим чанком
+        if previous_transcript:
+            transcript = drop_boundary_overlap(previous_transcript, transcript)
+        previous_transcript = transcript
         
-        # Проверяем, это индекс субтитра (только цифры)
-        if line_stripped.isdigit():
-            # Перенумеровываем индекс
-            new_index = int(line_stripped) + index_offset
-            adjusted_lines.append(str(new_index))
-        elif '-->' in line:
-            # Корректируем тайминг
-            start, end = line.split(' --> ')
-            start = add_offset(start.strip())
-            end = add_offset(end.strip())
-            adjusted_lines.append(f"{start} --> {end}")
+        # Субтитры чанка пронумерованы с 1 - следующий чанк продолжает с его последнего индекса
+        subtitle_count = last_srt_index(transcript)
+        
+        # Перенумеровываем индексы начиная с offset (для чанков после первого)
+        # Тайминги уже со смещением - adjust_srt_timings при offset_seconds=0 трогает только строки индексов
+        if index_offset:
+            adjusted_transcript = adjust_srt_timings(transcript, offset_seconds=0, index_offset=index_offset)
         else:
-            # Остальное переносим как есть (включая пустые строки!)
-            adjusted_lines.append(line)
+            adjusted_transcript = transcript
+        
+        index_offset += subtitle_count
+        all_transcripts.append(adjusted_transcript)
+        print(f"   ✓ Чанк {chunk_num}: {subtitle_count} субтитров", flush=True)
     
-    return '\n'.join(adjusted_lines)
+    return ('\n\n'.join(all_transcripts), index_offset)
 
 
-async def transcribe_audio_async(audio_paths: List[str], api_key: str, sequential: bool = True, cache_dir: str = None) -> str:
+async def transcribe_audio_async(
+    video_path: str,
+    api_key: str,
+    sequential: bool = True,
+    cache_dir: str = None,
+    max_parallel: int = WHISPER_MAX_PARALLEL,
+    async_client: AsyncOpenAI = None,
+    on_chunk_done: Callable[[int, str], None] = None
+) -> str:
     """
-    Асинхронно транскрибирует аудио через Whisper API
-    sequential: если True - обрабатывает последовательно (надежнее), если False - параллельно (быстрее но нестабильно)
+    Асинхронно транскрибирует аудио видео через Whisper API
+    Аудио извлекается сразу частями (до ~12MB), и каждая часть отправляется в Whisper
+    как только ffmpeg её записал (извлечение и загрузка идут одновременно)
+    sequential: если True - чанки отправляются по одному (надежнее), если False - до max_parallel одновременно (быстрее)
     cache_dir: папка для кэширования чанков (чтобы не транскрибировать повторно)
+    async_client: общий клиент (например, с этапом перевода); если не передан - создается свой
+    on_chunk_done: колбэк для каждого готового чанка (см. transcribe_audio_chunks_async)
     Возвращает SRT контент
     """
-    if len(audio_paths) == 1:
-        # Один файл - используем синхронную версию (проще)
-        print(f"🎤 Транскрибирую аудио через Whisper API...", flush=True)
-        sync_client = OpenAI(api_key=api_key, timeout=1200.0)
-        transcript = transcribe_audio_chunk(audio_paths[0], sync_client)
-        print(f"✅ Транскрипция завершена", flush=True)
-        return transcript
+    # Повторный запуск после полной транскрипции: все чанки берем по манифесту из кэша,
+    # без ffprobe, ffmpeg и хэширования частей
+    manifest = load_chunk_manifest(cache_dir, video_path) if cache_dir else {}
+    cached_results = load_manifest_transcripts(cache_dir, manifest) if manifest else None
+    if cached_results is not None:
+        print(f"💾 Все {len(cached_results)} чанков уже транскрибированы ({CHUNK_MANIFEST_NAME}) - извлечение аудио не нужно", flush=True)
+        if on_chunk_done:
+            for result in cached_results:
+                on_chunk_done(*result)
+        combined, subtitle_count = combine_chunk_transcripts(cached_results)
+        print(f"✅ Транскрипция загружена из кэша (всего {subtitle_count} субтитров)", flush=True)
+        return combined
+    
+    # mp3-дорожку с подходящим битрейтом режем как есть - без декодирования и кодирования
+    source_audio_kbps = copyable_audio_kbps(video_path)
+    if source_audio_kbps:
+        print(f"🎵 Аудиодорожка уже mp3 ({source_audio_kbps} kbps) - режу на части без перекодирования", flush=True)
+    bitrate_kbps = source_audio_kbps or AUDIO_BITRATE_KBPS
+    chunk_duration, total_chunks = plan_audio_chunks(video_path, bitrate_kbps=bitrate_kbps)
+    
+    # Другой план нарезки - старые записи манифеста не относятся к новым частям
+    if cache_dir and (manifest.get('chunk_duration'), manifest.get('total_chunks')) != (chunk_duration, total_chunks):
+        manifest = {
+            'video': video_fingerprint(video_path),
+            'chunk_duration': chunk_duration,
+            'total_chunks': total_chunks,
+            'chunks': {}
+        }
     
+    # Части аудио живут во временной папке, которая удаляется целиком в конце
+    # (в оперативной памяти, если есть tmpfs с запасом места - тогда на диск они не пишутся вовсе)
+    audio_bytes = total_chunks * chunk_duration * bitrate_kbps * 1000 / 8
+    with tempfile.TemporaryDirectory(prefix='subtitle_audio_', dir=pick_audio_work_dir(audio_bytes)) as work_dir:
+        output_prefix = os.path.join(work_dir, 'audio')
+        if async_client is not None:
+            return await transcribe_audio_chunks_async(
+                video_path, output_prefix, chunk_duration, total_chunks, async_client,
+                sequential=sequential, cache_dir=cache_dir, max_parallel=max_parallel,
+                on_chunk_done=on_chunk_done, source_audio_kbps=source_audio_kbps,
+                manifest=manifest
+            )
+        
+        # Один асинхронный клиент (и пул соединений) на все чанки
+        async with create_async_client(api_key, timeout=1200.0) as own_client:
+            return await transcribe_audio_chunks_async(
+                video_path, output_prefix, chunk_duration, total_chunks, own_client,
+                sequential=sequential, cache_dir=cache_dir, max_parallel=max_parallel,
+                on_chunk_done=on_chunk_done, source_audio_kbps=source_audio_kbps,
+                manifest=manifest
+            )
+
+
+async def transcribe_audio_chunks_async(
+    video_path: str,
+    output_prefix: str,
+    chunk_duration: int,
+    total_chunks: int,
+    async_client: AsyncOpenAI,
+    sequential: bool = True,
+    cache_dir: str = None,
+    max_parallel: int = WHISPER_MAX_PARALLEL,
+    on_chunk_done: Callable[[int, str], None] = None,
+    source_audio_kbps: int = 0,
+    manifest: dict = None
+) -> str:
+    """
+    Извлекает аудио частями (output_prefix_partNNN.mp3) и транскрибирует их по мере готовности
+    on_chunk_done(номер_чанка, SRT_контент): вызывается для каждого успешно транскрибированного чанка
+    (тайминги уже со смещением, нумерация своя у каждого чанка)
+    source_audio_kbps: битрейт исходной mp3-дорожки, если она режется без перекодирования (0 - перекодировать)
+    manifest: манифест чанков (см. load_chunk_manifest) - в нем отмечается каждый обработанный чанк,
+    и он сразу перезаписывается в cache_dir, чтобы повторный запуск знал что уже готово
+    Возвращает объединенный SRT контент с правильной нумерацией
+    """
     if sequential:
         # ПОСЛЕДОВАТЕЛЬНАЯ ОБРАБОТКА - надежнее для Whisper API
-        print(f"🎤 Транскрибирую аудио через Whisper API ({len(audio_paths)} частей ПОСЛЕДОВАТЕЛЬНО)...", flush=True)
+        print(f"🎤 Транскрибирую аудио через Whisper API ({total_chunks} частей ПОСЛЕДОВАТЕЛЬНО)...", flush=True)
         print(f"   💡 Последовательная обработка надежнее для больших файлов", flush=True)
+    else:
+        # ПАРАЛЛЕЛЬНАЯ ОБРАБОТКА (может быть нестабильна для больших файлов)
+        print(f"🎤 Транскрибирую аудио через Whisper API ({total_chunks} частей ПАРАЛЛЕЛЬНО, до {max_parallel} одновременно)...", flush=True)
+    print(f"   💡 Первые части уходят в Whisper пока ffmpeg дописывает остальные", flush=True)
+    
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        print(f"   💾 Кэш чанков: {cache_dir}", flush=True)
+    
+    semaphore = asyncio.Semaphore(1 if sequential else max_parallel)
+    # Вместо фиксированной паузы между чанками - лимит по частоте запросов
+    rate_limiter = RequestRateLimiter(WHISPER_RPM, burst=1 if sequential else max_parallel)
+    # Хвосты текста готовых чанков - prompt для следующего чанка
+    # (в последовательном режиме чанки идут строго по порядку, поэтому хвост предыдущего уже готов)
+    chunk_tails = {}
+    
+    def chunk_done(result: Tuple[int, str], chunk_hash: str, offset: int) -> Tuple[int, str]:
+        """Постобработка успешного чанка: чистка повторов, хвост для prompt, колбэк, манифест"""
+        result = (result[0], drop_repeated_cues(result[1]))
+        chunk_tails[result[0]] = srt_text_tail(result[1])
+        if on_chunk_done:
+            on_chunk_done(*result)
+        if manifest is not None and chunk_hash:
+            manifest['chunks'][str(result[0])] = {
+                'offset': offset,
+                'srt_file': chunk_cache_name(chunk_hash),
+                'status': 'done'
+            }
+            save_chunk_manifest(cache_dir, manifest)
+        return result
+    
+    async def process_chunk(chunk_num: int, chunk_path: str):
+        # Смещение считаем из длительности сегмента - segment muxer режет по абсолютному времени
+        offset = (chunk_num - 1) * chunk_duration
         
-        if cache_dir:
-            os.makedirs(cache_dir, exist_ok=True)
-            print(f"   💾 Кэш чанков: {cache_dir}", flush=True)
-        
-        async_client = AsyncOpenAI(api_key=api_key, timeout=1200.0)
-        
-        # Вычисляем смещения для каждого чанка
-        offsets = [0]
-        for audio_path in audio_paths[:-1]:
-            duration = get_audio_duration(audio_path)
-            offsets.append(offsets[-1] + duration)
-        
-        all_transcripts = []
-        
-        for i, (audio_path, offset) in enumerate(zip(audio_paths, offsets), 1):
-            print(f"\n📍 Обрабатываю чанк {i}/{len(audio_paths)}...", flush=True)
-            
-            # Пауза перед отправкой (кроме первого чанка) чтобы не перегружать API
-            if i > 1:
-                pause_seconds = 15
-                print(f"   ⏸️  Пауза {pause_seconds} сек перед отправкой (чтобы не перегружать Whisper API)...", flush=True)
-                await asyncio.sleep(pause_seconds)
-            
+        async with semaphore:
             try:
-                chunk_num, transcript = await transcribe_audio_chunk_async(
-                    audio_path=audio_path,
-                    chunk_num=i,
-                    total_chunks=len(audio_paths),
-                    async_client=async_client,
-                    offset=offset,
-                    cache_dir=cache_dir
-                )
-                all_transcripts.append((chunk_num, transcript))
-                print(f"   ✅ Чанк {i} успешно обработан и сохранен!", flush=True)
+                print(f"\n📍 Обрабатываю чанк {chunk_num}/{total_chunks}...")
                 
-            except Exception as e:
-                print(f"   ❌ Ошибка при обработке чанка {i}: {e}", flush=True)
-                print(f"   🔄 Пробую еще раз через 20 секунд...", flush=True)
+                prompt = chunk_tails.get(chunk_num - 1) if sequential else None
+                # Хэш части - ключ кэша и запись в манифесте
+                chunk_hash = await asyncio.to_thread(file_content_hash, chunk_path) if cache_dir else None
                 
-                # Retry один раз с большей паузой
                 try:
-                    await asyncio.sleep(20)
-                    print(f"   📤 Повторная отправка чанка {i}...", flush=True)
-                    chunk_num, transcript = await transcribe_audio_chunk_async(
-                        audio_path=audio_path,
-                        chunk_num=i,
-                        total_chunks=len(audio_paths),
+                    result = await transcribe_audio_chunk_async(
+                        audio_path=chunk_path,
+                        chunk_num=chunk_num,
+                        total_chunks=total_chunks,
                         async_client=async_client,
-                        offset=offset
+                        offset=offset,
+                        cache_dir=cache_dir,
+                        prompt=prompt,
+                        rate_limiter=rate_limiter,
+                        bitrate_kbps=source_audio_kbps or AUDIO_BITRATE_KBPS,
+                        chunk_hash=chunk_hash
                     )
-                    all_transcripts.append((chunk_num, transcript))
-                    print(f"   ✅ Чанк {i} обработан после retry!", flush=True)
-                except Exception as e2:
-                    print(f"   ❌ Повторная попытка тоже не удалась: {e2}", flush=True)
-                    print(f"   ⚠️  Пропускаю этот чанк, продолжаю со следующим...", flush=True)
-                    continue
-        
-        if not all_transcripts:
-            raise Exception("Все чанки завершились с ошибкой!")
-        
-        # Объединяем результаты
-        print(f"\n🔗 Объединяю {len(all_transcripts)} успешных чанков...", flush=True)
-        
-        all_transcripts.sort(key=lambda x: x[0])
-        index_offset = 0
-        combined_transcripts = []
-        
-        for chunk_num, transcript in all_transcripts:
-            subtitle_count = transcript.strip().count('\n\n') + 1 if transcript.strip() else 0
-            
-            if chunk_num > 1 and index_offset > 0:
-                adjusted_transcript = adjust_srt_timings(transcript, offset_seconds=0, index_offset=index_offset)
-            else:
-                adjusted_transcript = transcript
-            
-            index_offset += subtitle_count
-            combined_transcripts.append(adjusted_transcript)
-            print(f"   ✓ Чанк {chunk_num}: {subtitle_count} субтитров", flush=True)
-        
-        combined = '\n\n'.join(combined_transcripts)
-        print(f"✅ Транскрипция всех {len(audio_paths)} частей завершена (всего {index_offset} субтитров)!", flush=True)
-        return combined
-    
-    # ПАРАЛЛЕЛЬНАЯ ОБРАБОТКА (может быть нестабильна для больших файлов)
-    print(f"🎤 Транскрибирую аудио через Whisper API ({len(audio_paths)} частей ПАРАЛЛЕЛЬНО)...", flush=True)
-    
-    # Создаем асинхронный клиент
-    async_client = AsyncOpenAI(api_key=api_key, timeout=1200.0)
-    
-    # Вычисляем смещения для каждого чанка
-    offsets = [0]
-    for audio_path in audio_paths[:-1]:
-        duration = get_audio_duration(audio_path)
-        offsets.append(offsets[-1] + duration)
+                    result = chunk_done(result, chunk_hash, offset)
+                    print(f"   ✅ Чанк {chunk_num} успешно обработан и сохранен!")
+                    return result
+                
+                except Exception as e:
+                    # Временные ошибки уже повторены внутри transcribe_audio_chunk_async (до OPENAI_MAX_ATTEMPTS),
+                    # здесь - только окончательный отказ
+                    print(f"   ❌ Ошибка при обработке чанка {chunk_num}: {e}", flush=True)
+                    print(f"   ⚠️  Пропускаю этот чанк, продолжаю со следующим...", flush=True)
+                    if manifest is not None and cache_dir:
+                        manifest['chunks'][str(chunk_num)] = {'offset': offset, 'status': 'failed'}
+                        save_chunk_manifest(cache_dir, manifest)
+                    return None
+            finally:
+                # Часть больше не нужна - удаляем сразу, не дожидаясь остальных
+                # (одним вызовом без предварительной проверки; остальное уберет TemporaryDirectory)
+                Path(chunk_path).unlink(missing_ok=True)
+    
+    # Продюсер (ffmpeg segment muxer) кладёт готовые части в очередь,
+    # для каждой части сразу запускаем задачу транскрипции
+    queue = asyncio.Queue()
+    producer = asyncio.create_task(extract_audio_chunks_async(
+        video_path, output_prefix, chunk_duration, queue, copy_audio=bool(source_audio_kbps)
+    ))
     
-    # Создаем задачи для всех чанков
     tasks = []
-    for i, (audio_path, offset) in enumerate(zip(audio_paths, offsets), 1):
-        task = transcribe_audio_chunk_async(
-            audio_path=audio_path,
-            chunk_num=i,
-            total_chunks=len(audio_paths),
-            async_client=async_client,
-            offset=offset
-        )
-        tasks.append(task)
+    while True:
+        item = await queue.get()
+        if item is None:
+            break
+        chunk_num, chunk_path = item
+        tasks.append(asyncio.create_task(process_chunk(chunk_num, chunk_path)))
     
-    print(f"🚀 Запускаю транскрипцию {len(audio_paths)} чанков одновременно...", flush=True)
-    print(f"   💡 Все чанки обрабатываются параллельно - это намного быстрее!", flush=True)
+    # Пробрасываем ошибку ffmpeg если извлечение не удалось
+    await producer
     
-    # Выполняем все задачи параллельно с обработкой частичных ошибок
-    # Используем return_exceptions=True чтобы получить все результаты (включая ошибки)
-    results = await asyncio.gather(*tasks, return_exceptions=True)
+    results = await asyncio.gather(*tasks)
     
     # Разделяем на успешные и неудачные
-    successful_results = []
-    failed_chunks = []
-    
-    for i, result in enumerate(results, 1):
-        if isinstance(result, Exception):
-            failed_chunks.append(i)
-            print(f"   ❌ Чанк {i} завершился с ошибкой: {type(result).__name__}: {result}", flush=True)
-        else:
-            successful_results.append(result)
+    successful_results = [result for result in results if result is not None]
+    failed_chunks = [i for i, result in enumerate(results, 1) if result is None]
     
     # Проверяем что хоть что-то получилось
     if not successful_results:
-        print(f"\n❌ Все {len(audio_paths)} чанков завершились с ошибкой!", flush=True)
+        print(f"\n❌ Все {len(results)} чанков завершились с ошибкой!", flush=True)
         raise Exception("Все чанки завершились с ошибкой! Проверьте подключение к API или попробуйте позже.")
     
     # Если есть неудачные - предупреждаем
     if failed_chunks:
-        print(f"\n⚠️  ВНИМАНИЕ: {len(failed_chunks)} из {len(audio_paths)} чанков не обработано: {failed_chunks}", flush=True)
+        print(f"\n⚠️  ВНИМАНИЕ: {len(failed_chunks)} из {len(results)} чанков не обработано: {failed_chunks}", flush=True)
         print(f"   Продолжаю с {len(successful_results)} успешными чанками...", flush=True)
         print(f"   💡 Субтитры будут неполными - можно запустить повторно позже", flush=True)
     
     # Перенумеровываем индексы субтитров при объединении
-    print(f"🔗 Объединяю {len(successful_results)} чанков с правильной нумерацией субтитров...", flush=True)
-    
-    # Сортируем по номеру чанка
-    successful_results.sort(key=lambda x: x[0])
-    
-    all_transcripts = []
-    index_offset = 0
-    
-    for chunk_num, transcript in successful_results:
-        # Подсчитываем количество субтитров в этом чанке
-        subtitle_count = transcript.strip().count('\n\n') + 1 if transcript.strip() else 0
-        
-        # Перенумеровываем индексы начиная с offset (для чанков после первого)
-        if chunk_num > 1 and index_offset > 0:
-            adjusted_transcript = adjust_srt_timings(transcript, offset_seconds=0, index_offset=index_offset)
-        else:
-            adjusted_transcript = transcript
-        
-        index_offset += subtitle_count
-        all_transcripts.append(adjusted_transcript)
-        print(f"   ✓ Чанк {chunk_num}: {subtitle_count} субтитров", flush=True)
-    
-    combined = '\n\n'.join(all_transcripts)
+    print(f"\n🔗 Объединяю {len(successful_results)} чанков с правильной нумерацией субтитров...", flush=True)
+    combined, subtitle_count = combine_chunk_transcripts(successful_results)
     
     if failed_chunks:
-        print(f"⚠️  Транскрипция завершена ЧАСТИЧНО: {len(successful_results)}/{len(audio_paths)} чанков (всего {index_offset} субтитров)", flush=True)
+        print(f"⚠️  Транскрипция завершена ЧАСТИЧНО: {len(successful_results)}/{len(results)} чанков (всего {subtitle_count} субтитров)", flush=True)
     else:
-        print(f"✅ Транскрипция всех {len(audio_paths)} частей завершена (всего {index_offset} субтитров)!", flush=True)
+        print(f"✅ Транскрипция всех {len(results)} частей завершена (всего {subtitle_count} субтитров)!", flush=True)
     
     return combined
 
 
-def transcribe_audio(audio_paths: List[str], client: OpenAI, cache_dir: str = None) -> str:
+def transcribe_audio(video_path: str, api_key: str, cache_dir: str = None, parallel: bool = False) -> str:
     """
-    Транскрибирует аудио через Whisper API
+    Транскрибирует аудио видео через Whisper API
     Обертка для запуска асинхронной версии из синхронного кода
     cache_dir: папка для кэширования чанков
+    parallel: отправлять чанки одновременно (до WHISPER_MAX_PARALLEL) вместо последовательной отправки с паузами
     Возвращает SRT контент
     """
-    # Получаем API ключ из клиента
-    api_key = client.api_key
-    
     # Для Windows: устанавливаем правильную политику event loop
     if sys.platform == 'win32':
         asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
     
     try:
-        return asyncio.run(transcribe_audio_async(audio_paths, api_key, cache_dir=cache_dir))
+        return asyncio.run(transcribe_audio_async(video_path, api_key, sequential=not parallel, cache_dir=cache_dir))
     finally:
         # Подавляем ошибки закрытия event loop на Windows
         if sys.platform == 'win32':
@@ -735,51 +1297,221 @@ def transcribe_audio(audio_paths: List[str], client: OpenAI, cache_dir: str = No
             warnings.filterwarnings('ignore', category=RuntimeWarning, message='.*Event loop is closed.*')
 
 
-def parse_srt(srt_content: str) -> List[SubtitleEntry]:
-    """Парсит SRT контент в список SubtitleEntry"""
-    entries = []
-    blocks = srt_content.strip().split('\n\n')
+def transcribe_audio_local(
+    video_path: str,
+    model_size: str = FASTER_WHISPER_MODEL,
+    batch_size: int = FASTER_WHISPER_BATCH_SIZE
+) -> str:
+    """
+    Транскрибирует аудио локально через faster-whisper (CTranslate2, int8) - без API и без чанков
+    Аудио декодируется прямо из видео, VAD-фильтр (Silero) выкидывает тишину до распознавания
+    batch_size: сколько фрагментов речи декодировать за один проход модели (1 - без батчинга)
+    Возвращает SRT контент
+    """
+    try:
+        import ctranslate2
+        from faster_whisper import WhisperModel
+    except ImportError:
+        raise Exception("faster-whisper не установлен! Установите: pip install faster-whisper")
     
-    for block in blocks:
-        lines = block.strip().split('\n')
-        if len(lines) < 3:
-            continue
+    try:
+        # Батчевый режим есть в faster-whisper >= 1.1
+        from faster_whisper import BatchedInferencePipeline
+    except ImportError:
+        BatchedInferencePipeline = None
+    
+    # На GPU - int8 веса с float16 вычислениями, на CPU - чистый int8
+    device = 'cuda' if ctranslate2.get_cuda_device_count() > 0 else 'cpu'
+    compute_type = 'int8_float16' if device == 'cuda' else 'int8'
+    
+    print(f"🎤 Транскрибирую аудио локально через faster-whisper ({model_size}, {device}, {compute_type})...", flush=True)
+    model = WhisperModel(model_size, device=device, compute_type=compute_type)
+    
+    # segments - генератор: распознавание идет по мере чтения
+    if BatchedInferencePipeline is not None and batch_size > 1:
+        # VAD режет аудио на фрагменты речи, и они идут в модель пачками по batch_size
+        # (один проход энкодера на пачку вместо последовательного декодирования)
+        print(f"   🚀 Батчевое распознавание: до {batch_size} фрагментов за проход", flush=True)
+        batched_model = BatchedInferencePipeline(model=model)
+        segments, info = batched_model.transcribe(video_path, language='ru', vad_filter=True, batch_size=batch_size)
+    else:
+        segments, info = model.transcribe(video_path, language='ru', vad_filter=True)
+    print(f"   Длительность аудио: {info.duration / 60:.1f} минут", flush=True)
+    
+    srt_blocks = []
+    for i, segment in enumerate(segments, 1):
+        start_time = format_srt_time(round(segment.start * 1000))
+        end_time = format_srt_time(round(segment.end * 1000))
+        srt_blocks.append(f"{i}\n{start_time} --> {end_time}\n{segment.text.strip()}\n")
         
-        try:
-            index = int(lines[0])
-            timing = lines[1]
-            text = '\n'.join(lines[2:])
-            
-            # Парсим тайминг
-            match = re.match(r'(\d{2}:\d{2}:\d{2},\d{3})\s*-->\s*(\d{2}:\d{2}:\d{2},\d{3})', timing)
-            if match:
-                start_time, end_time = match.groups()
-                entries.append(SubtitleEntry(index, start_time, end_time, text))
-        except (ValueError, IndexError):
-            continue
+        if i % 50 == 0:
+            print(f"   ⏳ Распознано {segment.end / 60:.1f} из {info.duration / 60:.1f} минут...", flush=True)
     
+    print(f"✅ Транскрипция завершена ({len(srt_blocks)} субтитров)", flush=True)
+    return drop_repeated_cues('\n'.join(srt_blocks))
+
+
+def parse_srt(srt_content: str) -> List[SubtitleEntry]:
+    """
+    Парсит SRT контент в список SubtitleEntry
+    Один проход скомпилированной регуляркой по всему тексту, битые блоки просто не совпадают
+    Тайминги с точкой вместо запятой (00:00:01.000, как в VTT) приводятся к формату SRT
+    """
+    entries = [
+        SubtitleEntry(int(index), start_time, end_time, text)
+        for index, start_time, end_time, text in _SRT_BLOCK_RE.findall(srt_content)
+    ]
+    for entry in entries:
+        if '.' in entry.start_time or '.' in entry.end_time:
+            entry.start_time = entry.start_time.replace('.', ',')
+            entry.end_time = entry.end_time.replace('.', ',')
     return entries
 
 
-async def translate_batch_async(
-    batch: List[SubtitleEntry], 
-    batch_num: int, 
-    total_batches: int,
-    client: AsyncOpenAI, 
-    model: str
-) -> List[SubtitleEntry]:
+def drop_repeated_cues(srt_content: str) -> str:
     """
-    Асинхронно переводит один батч субтитров
-    Большие батчи (40-50) обеспечивают достаточный контекст
+    Чистит SRT от подряд идущих субтитров с одинаковым текстом (типичный артефакт Whisper
+    на музыке и тишине) и от пустых (их не пропускает parse_srt): повтор не теряет время,
+    а продлевает предыдущий субтитр. Если чистить нечего - возвращает SRT без изменений
+    Субтитры перенумеровываются с 1
     """
-    print(f"   Обрабатываю батч {batch_num}/{total_batches} ({len(batch)} записей)...", flush=True)
+    entries = parse_srt(srt_content)
+    cleaned = []
+    for entry in entries:
+        if cleaned and entry.text.strip() == cleaned[-1].text.strip():
+            cleaned[-1].end_time = entry.end_time
+        else:
+            cleaned.append(entry)
     
-    # Формируем промпт с пронумерованными строками
-    prompt_lines = []
-    for entry in batch:
-        prompt_lines.append(f"[{entry.index}] {entry.text}")
+    block_count = srt_content.strip().count('\n\n') + 1 if srt_content.strip() else 0
+    if len(cleaned) == block_count:
+        return srt_content
+    
+    print(f"   🧹 Убрано {block_count - len(cleaned)} пустых и повторяющихся субтитров", flush=True)
+    return '\n'.join(
+        f"{number}\n{entry.start_time} --> {entry.end_time}\n{entry.text}\n"
+        for number, entry in enumerate(cleaned, 1)
+    )
+
+
+def translation_cache_key(model: str, text: str) -> str:
+    """Ключ кэша перевода: blake2b от модели и исходного текста (16 байт хватает с запасом)"""
+    return hashlib.blake2b(f"{model}\0{text}".encode('utf-8'), digest_size=16).hexdigest()
+
+
+def open_translation_cache(cache_path: str) -> sqlite3.Connection:
+    """Открывает (и при необходимости создает) SQLite кэш переводов"""
+    connection = sqlite3.connect(cache_path)
+    connection.execute(
+        "CREATE TABLE IF NOT EXISTS translations (hash TEXT PRIMARY KEY, model TEXT, en TEXT)"
+    )
+    return connection
+
+
+def load_cached_translations(cache_path: str, keys: List[str]) -> dict:
+    """Возвращает словарь ключ -> перевод для ключей, которые уже есть в кэше"""
+    found = {}
+    unique_keys = list(dict.fromkeys(keys))
+    connection = open_translation_cache(cache_path)
+    try:
+        # Запрашиваем пачками - у SQLite ограничено число параметров в одном запросе
+        for i in range(0, len(unique_keys), 500):
+            chunk = unique_keys[i:i + 500]
+            placeholders = ','.join('?' * len(chunk))
+            rows = connection.execute(
+                f"SELECT hash, en FROM translations WHERE hash IN ({placeholders})", chunk
+            )
+            found.update(rows)
+    finally:
+        connection.close()
+    return found
+
+
+def store_translations(cache_path: str, model: str, translations: List[Tuple[str, str]]) -> None:
+    """Сохраняет пары (ключ, перевод) в кэш одной транзакцией"""
+    if not translations:
+        return
+    connection = open_translation_cache(cache_path)
+    try:
+        with connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO translations (hash, model, en) VALUES (?, ?, ?)",
+                [(key, model, text) for key, text in translations]
+            )
+    finally:
+        connection.close()
+
+
+async def create_chat_completion_with_backoff(
+    client: AsyncOpenAI,
+    api_params: dict,
+    batch_num: int,
+    limiter: AdaptiveConcurrencyLimiter = None
+):
+    """
+    Вызывает Chat Completions API с экспоненциальной паузой (с джиттером) при 429, таймаутах,
+    обрывах соединения и 5xx (OPENAI_TRANSIENT_ERRORS)
+    Если сервер прислал Retry-After - ждем сколько он сказал
+    limiter: слот берется на каждую попытку и освобождается до паузы - после 429 ждущие запросы
+    не держат слоты, и сниженный лимит действительно уменьшает нагрузку; получает исход каждого запроса
+    Остальные ошибки и последняя неудачная попытка пробрасываются наружу
+    """
+    if limiter is None:
+        limiter = AdaptiveConcurrencyLimiter(OPENAI_MAX_CONCURRENCY)
+    # Собственные повторы SDK (по умолчанию 2) выключены: они спали бы внутри слота limiter,
+    # прятали 429 от AIMD и умножали число HTTP запросов на попытку - повторяем только здесь
+    client = client.with_options(max_retries=0)
     
-    system_instruction = """You are a professional subtitle translator. Translate Russian subtitles into natural, conversational English.
+    for attempt in range(1, OPENAI_MAX_ATTEMPTS + 1):
+        try:
+            async with limiter:
+                response = await client.chat.completions.create(**api_params)
+            limiter.on_success()
+            return response
+        except OPENAI_TRANSIENT_ERRORS as e:
+            if isinstance(e, RateLimitError):
+                limiter.on_rate_limited()
+            if attempt == OPENAI_MAX_ATTEMPTS:
+                raise
+            delay = backoff_delay(e, attempt)
+            print(f"   ⏳ Батч {batch_num}: {type(e).__name__}, повтор {attempt}/{OPENAI_MAX_ATTEMPTS - 1} через {delay:.1f} сек...", flush=True)
+            await asyncio.sleep(delay)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Грубая оценка числа токенов без токенизатора: русский текст - примерно 3 символа на токен
+    (len // 4 верно для английского, кириллица дробится мельче); +4 на "[номер] " и перевод строки
+    """
+    return len(text) // 3 + 4
+
+
+def plan_translation_batches(entries: List[SubtitleEntry], positions: List[int], max_entries: int,
+                             max_tokens: int = TRANSLATION_BATCH_MAX_TOKENS) -> List[List[int]]:
+    """
+    Жадно делит позиции записей на батчи: батч закрывается на max_entries записях
+    или когда оценка входных токенов превысила бы max_tokens
+    Короткие реплики ("Да.", "Хорошо.") набирают полный батч, длинные - уходят меньшими и быстрее
+    Порядок позиций сохраняется
+    """
+    batches = []
+    current = []
+    current_tokens = 0
+    for position in positions:
+        tokens = estimate_tokens(entries[position].text)
+        if current and (len(current) >= max_entries or current_tokens + tokens > max_tokens):
+            batches.append(current)
+            current = []
+            current_tokens = 0
+        current.append(position)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+# Системный промпт перевода - общий для всех батчей (обычные запросы, retry раунды и Batch API)
+TRANSLATION_SYSTEM_PROMPT = """You are a professional subtitle translator. Translate Russian subtitles into natural, conversational English.
 
 CRITICAL RULES:
 1. Translate ALL subtitles in the batch - NEVER skip any
@@ -808,242 +1540,684 @@ Example with complete sentence:
 Output:
 [1] Good afternoon, colleagues! Today we're presenting the phytobar design.
 [2] Let's start with the layout solution."""
-    
+
+
+def build_translation_request(batch: List[SubtitleEntry], model: str) -> dict:
+    """
+    Параметры Chat Completions запроса для перевода батча: промпт с пронумерованными строками
+    Одни и те же для обычного запроса и для строки JSONL в Batch API
+    """
+    # Формируем промпт с пронумерованными строками
+    prompt_lines = '\n'.join(f"[{entry.index}] {entry.text}" for entry in batch)
     user_input = f"""<subtitles_to_translate>
-{chr(10).join(prompt_lines)}
+{prompt_lines}
 </subtitles_to_translate>
 
-Translate all subtitles above into English. Output format: [number] translated_text"""
+Translate all {len(batch)} subtitles above into English - exactly {len(batch)} lines, numbers preserved. Output format: [number] translated_text"""
     
-    try:
-        # Используем Chat Completions API
-        messages = [
-            {"role": "system", "content": system_instruction},
-            {"role": "user", "content": user_input}
-        ]
-        
-        api_params = {
-            "model": model,
-            "messages": messages,
-            "temperature": 0.7
-        }
+    # Используем Chat Completions API
+    messages = [
+        {"role": "system", "content": TRANSLATION_SYSTEM_PROMPT},
+        {"role": "user", "content": user_input}
+    ]
+    
+    api_params = {
+        "model": model,
+        "messages": messages,
+        "temperature": 0.7
+    }
+    
+    # GPT-5 требует temperature=1 и max_completion_tokens (больше т.к. reasoning тоже считается)
+    if model.startswith('gpt-5') or model.startswith('o1') or model.startswith('o3'):
+        api_params["temperature"] = 1.0
+        api_params["max_completion_tokens"] = 16000  # Увеличено для reasoning + ответ
+    else:
+        api_params["max_tokens"] = 4000
+    
+    return api_params
+
+
+def parse_translated_batch(batch: List[SubtitleEntry], translated_text: str) -> Tuple[List[SubtitleEntry], List]:
+    """
+    Сопоставляет ответ модели ([номер] перевод) с записями батча
+    Строки-продолжения (модель перенесла перевод) не теряются, а приклеиваются к своей записи
+    Возвращает (записи батча в том же порядке, индексы непереведенных - у них остается оригинал)
+    """
+    # Один проход по всему ответу; перевод, разбитый моделью на несколько строк, склеивается в одну
+    translation_map = {
+        int(idx): ' '.join(line.strip() for line in text.splitlines())
+        for idx, text in _BATCH_LINE_RE.findall(translated_text)
+    }
+    
+    # Создаем новые записи с переведенным текстом
+    translated_batch = []
+    untranslated = []
+    
+    for entry in batch:
+        translated_text = translation_map.get(entry.index)
         
-        # GPT-5 требует temperature=1 и max_completion_tokens (больше т.к. reasoning тоже считается)
-        if model.startswith('gpt-5') or model.startswith('o1') or model.startswith('o3'):
-            api_params["temperature"] = 1.0
-            api_params["max_completion_tokens"] = 16000  # Увеличено для reasoning + ответ
+        # Проверяем что перевод получен И не содержит кириллицу
+        if translated_text and not has_cyrillic(translated_text):
+            # Сохраняем перевод как есть (разбивка на строки будет в post-processing)
+            translated_batch.append(
+                SubtitleEntry(entry.index, entry.start_time, entry.end_time, translated_text)
+            )
         else:
-            api_params["max_tokens"] = 4000
-        
-        response = await client.chat.completions.create(**api_params)
-        
-        translated_text = response.choices[0].message.content
-        if translated_text is None:
-            translated_text = ""
-        translated_text = translated_text.strip()
-        
-        # Парсим ответ
-        translated_lines = translated_text.split('\n')
-        translation_map = {}
-        
-        for line in translated_lines:
-            match = re.match(r'\[(\d+)\]\s*(.+)', line.strip())
-            if match:
-                idx, text = match.groups()
-                translation_map[int(idx)] = text.strip()
+            # Если не переведено или содержит кириллицу - оставляем оригинал и помечаем
+            translated_batch.append(entry)
+            untranslated.append(entry.index)
+    
+    return translated_batch, untranslated
+
+
+async def translate_batch_async(
+    batch: List[SubtitleEntry], 
+    batch_num: int, 
+    total_batches: int,
+    client: AsyncOpenAI, 
+    model: str,
+    limiter: AdaptiveConcurrencyLimiter = None
+) -> List[SubtitleEntry]:
+    """
+    Асинхронно переводит один батч субтитров
+    Большие батчи (40-50) обеспечивают достаточный контекст
+    limiter: общий на все батчи ограничитель одновременных запросов к API
+    """
+    if limiter is None:
+        limiter = AdaptiveConcurrencyLimiter(OPENAI_MAX_CONCURRENCY)
+    
+    # Прогресс по батчам и чанкам печатается без flush - его выталкивают сообщения этапов (с flush=True)
+    print(f"   Обрабатываю батч {batch_num}/{total_batches} ({len(batch)} записей)...")
+    
+    api_params = build_translation_request(batch, model)
+    
+    try:
+        # Не больше OPENAI_MAX_CONCURRENCY запросов одновременно (после 429 - меньше),
+        # иначе ловим 429 пачками и батч уходит в retry раунды (слот берется на каждую попытку)
+        response = await create_chat_completion_with_backoff(client, api_params, batch_num, limiter)
         
-        # Создаем новые записи с переведенным текстом
-        translated_batch = []
-        untranslated = []
+        # Ответ обрезан по лимиту токенов - хвост батча потерян целиком.
+        # Вместо retry раунда сразу делим батч пополам: половины гарантированно помещаются быстрее
+        if response.choices[0].finish_reason == 'length' and len(batch) > 1:
+            mid = len(batch) // 2
+            print(f"   ✂️  Батч {batch_num}: ответ обрезан по лимиту токенов, делю на 2 части по {mid}/{len(batch) - mid}", flush=True)
+            halves = await asyncio.gather(
+                translate_batch_async(batch[:mid], batch_num, total_batches, client, model, limiter),
+                translate_batch_async(batch[mid:], batch_num, total_batches, client, model, limiter)
+            )
+            return halves[0] + halves[1]
         
-        for entry in batch:
-            translated_text = translation_map.get(entry.index)
-            
-            # Проверяем что перевод получен И не содержит кириллицу
-            if translated_text and not re.search(r'[А-Яа-яЁё]', translated_text):
-                # Сохраняем перевод как есть (разбивка на строки будет в post-processing)
-                translated_batch.append(
-                    SubtitleEntry(entry.index, entry.start_time, entry.end_time, translated_text)
-                )
-            else:
-                # Если не переведено или содержит кириллицу - оставляем оригинал и помечаем
-                translated_batch.append(entry)
-                untranslated.append(entry.index)
+        translated_batch, untranslated = parse_translated_batch(batch, response.choices[0].message.content or "")
         
         if untranslated:
             print(f"   ⚠️  Батч {batch_num}: не переведено {len(untranslated)} записей: {untranslated[:5]}{'...' if len(untranslated) > 5 else ''}", flush=True)
         else:
-            print(f"   ✅ Батч {batch_num}/{total_batches} завершен", flush=True)
+            print(f"   ✅ Батч {batch_num}/{total_batches} завершен")
         
         return translated_batch
     
+    except (AuthenticationError, PermissionDeniedError):
+        # Неверный ключ / нет доступа к модели - повторять бессмысленно ни сейчас, ни в retry раундах
+        print(f"   ❌ Батч {batch_num}: OpenAI отклонил ключ или доступ к модели {model}", flush=True)
+        raise
     except Exception as e:
         print(f"   ⚠️  Ошибка в батче {batch_num}: {e}", flush=True)
         # В случае ошибки оставляем оригинальный текст
         return batch
 
 
-async def translate_subtitles_async(entries: List[SubtitleEntry], api_key: str, model: str = "gpt-4o-mini") -> List[SubtitleEntry]:
+async def translate_batches_via_batch_api(
+    batches: List[List[SubtitleEntry]],
+    client: AsyncOpenAI,
+    model: str
+) -> List[List[SubtitleEntry]]:
+    """
+    Переводит батчи одним заданием OpenAI Batch API: вдвое дешевле и без лимитов RPM,
+    но результат приходит с задержкой (до 24 часов)
+    Все батчи уходят одним JSONL файлом, задание опрашивается раз в BATCH_API_POLL_SECONDS
+    Возвращает результаты в порядке батчей; непереведенные записи (и батчи с ошибкой)
+    остаются на русском - их подберут retry раунды обычными запросами
+    При прерывании (Ctrl+C / отмена задачи) задание отменяется и на стороне OpenAI
+    """
+    # Нечего переводить (все из кэша) - не создаем пустое задание на 24 часа
+    if not batches:
+        return []
+    
+    jsonl = ''.join(
+        json.dumps({
+            "custom_id": f"batch_{batch_num}",
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": build_translation_request(batch, model)
+        }, ensure_ascii=False) + '\n'
+        for batch_num, batch in enumerate(batches)
+    )
+    
+    job = None
+    try:
+        input_file = await client.files.create(
+            file=('translation_batches.jsonl', jsonl.encode('utf-8'), 'application/jsonl'),
+            purpose='batch'
+        )
+        job = await client.batches.create(
+            input_file_id=input_file.id,
+            endpoint='/v1/chat/completions',
+            completion_window='24h'
+        )
+        print(f"📦 Batch API: задание {job.id} ({len(batches)} батчей), проверяю статус каждые {BATCH_API_POLL_SECONDS} сек...", flush=True)
+        
+        while job.status not in ('completed', 'failed', 'expired', 'cancelled'):
+            await asyncio.sleep(BATCH_API_POLL_SECONDS)
+            job = await client.batches.retrieve(job.id)
+            counts = job.request_counts
+            if counts:
+                print(f"   ⏳ Batch API: {job.status}, готово {counts.completed}/{counts.total}", flush=True)
+        
+        if not job.output_file_id:
+            print(f"   ⚠️  Batch API: задание завершилось со статусом {job.status} без результатов", flush=True)
+            return batches
+        output = await client.files.content(job.output_file_id)
+        output_text = output.text
+    except (asyncio.CancelledError, KeyboardInterrupt):
+        # Иначе брошенное задание продолжит выполняться (и тарифицироваться) на стороне OpenAI
+        if job is not None and job.status not in ('completed', 'failed', 'expired', 'cancelled'):
+            print(f"   🛑 Batch API: отменяю задание {job.id}...", flush=True)
+            try:
+                await client.batches.cancel(job.id)
+            except Exception as e:
+                print(f"   ⚠️  Не удалось отменить задание {job.id}: {e}", flush=True)
+        raise
+    except Exception as e:
+        print(f"   ⚠️  Ошибка Batch API: {e}", flush=True)
+        return batches
+    
+    # Строки результата идут в произвольном порядке - раскладываем по custom_id
+    # Битая строка не должна обрывать весь перевод после ожидания задания - такой батч остается как был
+    results = list(batches)
+    for line in output_text.splitlines():
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+            batch_num = int(record['custom_id'].rsplit('_', 1)[1])
+            response = record.get('response') or {}
+            if response.get('status_code') != 200:
+                continue
+            content = response['body']['choices'][0]['message'].get('content') or ""
+            results[batch_num], _ = parse_translated_batch(batches[batch_num], content)
+        except (ValueError, KeyError, IndexError, TypeError, AttributeError) as e:
+            print(f"   ⚠️  Batch API: пропускаю некорректную строку результата ({type(e).__name__}: {e})", flush=True)
+    
+    print(f"   ✅ Batch API: задание {job.id} завершено", flush=True)
+    return results
+
+
+async def translate_subtitles_async(
+    entries: List[SubtitleEntry],
+    api_key: str,
+    model: str = "gpt-4o-mini",
+    partial_path: str = None,
+    cache_path: str = None,
+    async_client: AsyncOpenAI = None,
+    use_batch_api: bool = False,
+    limiter: AdaptiveConcurrencyLimiter = None
+) -> List[SubtitleEntry]:
     """
     Переводит и улучшает субтитры через GPT параллельно (асинхронно)
     Обрабатывает все батчи одновременно для максимальной скорости
+    partial_path: если указан, готовые батчи дописываются туда по порядку сразу по завершении
+    (промежуточный результат виден до окончания перевода и не теряется при обрыве)
+    cache_path: SQLite кэш переводов - записи с уже переведенным текстом в GPT не отправляются
+    async_client: общий клиент (например, с этапом транскрипции); если не передан - создается и закрывается здесь
+    use_batch_api: основной проход через Batch API (дешевле, но дольше); retry раунды - обычными запросами
+    limiter: общий ограничитель одновременных запросов (например, на переводы всех чанков); если не передан - свой
+    Возвращает записи 1:1 со входными (разбивка длинных - в split_long_entries)
     """
     print(f"🌐 Перевожу и улучшаю субтитры через {model} (параллельно)...", flush=True)
     
-    # Создаем асинхронный клиент
-    async_client = AsyncOpenAI(api_key=api_key)
-    
-    batch_size = 40  # Увеличили для лучшего контекста!
-    total_batches = (len(entries) + batch_size - 1) // batch_size
-    
-    # Создаем задачи для всех батчей
-    tasks = []
-    for i in range(0, len(entries), batch_size):
-        batch = entries[i:i + batch_size]
-        batch_num = i // batch_size + 1
-        task = translate_batch_async(batch, batch_num, total_batches, async_client, model)
-        tasks.append(task)
-    
-    print(f"🚀 Запускаю {total_batches} батчей параллельно...", flush=True)
-    
-    # Выполняем все задачи параллельно
-    results = await asyncio.gather(*tasks)
-    
-    # Объединяем результаты в правильном порядке
-    translated_entries = []
-    for batch_result in results:
-        translated_entries.extend(batch_result)
+    # Один асинхронный клиент на все батчи и все retry раунды (свой, если общий не передан)
+    own_client = async_client is None
+    if own_client:
+        async_client = create_async_client(api_key)
+    # Ограничиваем число одновременных запросов (общий лимит на все раунды, снижается при 429)
+    if limiter is None:
+        limiter = AdaptiveConcurrencyLimiter(OPENAI_MAX_CONCURRENCY)
     
-    # ПРОВЕРКА КАЧЕСТВА: сначала убедимся что все переведено, ПОТОМ делаем post-processing
-    print(f"🔍 Проверяю качество перевода...", flush=True)
-    untranslated_count = sum(1 for e in translated_entries if re.search(r'[А-Яа-яЁё]', e.text))
-    
-    # RETRY LOGIC - делаем ДО post-processing чтобы индексы не менялись
-    retry_round = 0
-    max_retries = 2
-    
-    while untranslated_count > 0 and retry_round < max_retries:
-        retry_round += 1
-        print(f"\n⚠️  Обнаружено {untranslated_count} непереведенных записей", flush=True)
+    try:
+        # Сначала берем что можно из кэша переводов, в GPT уходят только промахи
+        translated_entries = [None] * len(entries)
+        cache_keys = [translation_cache_key(model, entry.text) for entry in entries] if cache_path else []
+        if cache_path:
+            cached = load_cached_translations(cache_path, cache_keys)
+            for position, entry in enumerate(entries):
+                cached_text = cached.get(cache_keys[position])
+                if cached_text is not None:
+                    translated_entries[position] = SubtitleEntry(entry.index, entry.start_time, entry.end_time, cached_text)
+            print(f"💾 Из кэша переводов: {len(entries) - translated_entries.count(None)}/{len(entries)} записей", flush=True)
+        miss_positions = [i for i, e in enumerate(translated_entries) if e is None]
         
-        # Собираем непереведенные записи с их индексами
-        to_retry = [e for e in translated_entries if re.search(r'[А-Яа-яЁё]', e.text)]
-        untranslated_indices = [e.index for e in to_retry]
-        print(f"   📋 Индексы: {untranslated_indices[:10]}{'...' if len(untranslated_indices) > 10 else ''}", flush=True)
-        print(f"   🔄 Запускаю retry #{retry_round}/{max_retries} (батчи по 20)...", flush=True)
+        # Одинаковые строки ("Да.", "Хорошо.") переводим один раз и раздаем перевод всем копиям
+        first_position_by_text = {}
+        copies_by_position = collections.defaultdict(list)
+        unique_positions = []
+        for position in miss_positions:
+            first_position = first_position_by_text.setdefault(entries[position].text, position)
+            if first_position == position:
+                unique_positions.append(position)
+            else:
+                copies_by_position[first_position].append(position)
+        if len(unique_positions) < len(miss_positions):
+            print(f"♻️  Повторяющихся строк: {len(miss_positions) - len(unique_positions)} - переводятся один раз", flush=True)
         
-        # Повторно переводим меньшими батчами для лучшей концентрации
-        retry_batch_size = 20
-        retry_tasks = []
-        for i in range(0, len(to_retry), retry_batch_size):
-            retry_batch = to_retry[i:i + retry_batch_size]
-            batch_num = i // retry_batch_size + 1
-            total_retry_batches = (len(to_retry) + retry_batch_size - 1) // retry_batch_size
-            task = translate_batch_async(retry_batch, batch_num, total_retry_batches, async_client, model)
-            retry_tasks.append(task)
+        # До 40 записей для контекста, но длинные реплики закрывают батч раньше (по оценке токенов)
+        batch_size = 40
+        batch_positions = plan_translation_batches(entries, unique_positions, batch_size)
+        total_batches = len(batch_positions)
         
-        retry_results = await asyncio.gather(*retry_tasks)
+        async def positioned_batch(batch_num: int, positions: List[int]):
+            batch = [entries[i] for i in positions]
+            return positions, await translate_batch_async(batch, batch_num, total_batches, async_client, model, limiter)
         
-        # Создаем карту переведенных записей по индексу
-        retry_map = {}
-        for batch_result in retry_results:
-            for entry in batch_result:
-                # Проверяем что действительно переведено (без кириллицы)
-                if not re.search(r'[А-Яа-яЁё]', entry.text):
-                    retry_map[entry.index] = entry
+        async def completed_batches():
+            """(позиции, переведенный батч) по мере готовности"""
+            if use_batch_api:
+                batch_results = await translate_batches_via_batch_api(
+                    [[entries[i] for i in positions] for positions in batch_positions], async_client, model
+                )
+                for item in zip(batch_positions, batch_results):
+                    yield item
+                return
+            
+            # Создаем задачи для всех батчей
+            tasks = [positioned_batch(batch_num, positions) for batch_num, positions in enumerate(batch_positions, 1)]
+            print(f"🚀 Запускаю {total_batches} батчей параллельно (до {OPENAI_MAX_CONCURRENCY} одновременно)...", flush=True)
+            for next_completed in asyncio.as_completed(tasks):
+                yield await next_completed
         
-        # Заменяем в основном списке только успешно переведенные
-        updated_entries = []
-        for entry in translated_entries:
-            if entry.index in retry_map:
-                updated_entries.append(retry_map[entry.index])
-            else:
-                updated_entries.append(entry)
-        translated_entries = updated_entries
+        # Батчи завершаются в произвольном порядке: раскладываем результат по позициям
+        # и дописываем в partial файл непрерывный готовый префикс
+        next_to_write = 0
+        stored_keys = set()
+        partial_file = open(partial_path, 'w', encoding='utf-8') if partial_path else None
+        try:
+            async for positions, batch_result in completed_batches():
+                for position, entry in zip(positions, batch_result):
+                    translated_entries[position] = entry
+                    for copy_position in copies_by_position.get(position, ()):
+                        original = entries[copy_position]
+                        translated_entries[copy_position] = SubtitleEntry(original.index, original.start_time, original.end_time, entry.text)
+                
+                # Удачные переводы батча сразу в кэш: если запуск оборвется,
+                # повторный не будет платить за уже переведенные строки
+                if cache_path:
+                    batch_translations = [
+                        (cache_keys[position], translated_entries[position].text)
+                        for position in positions
+                        if not has_cyrillic(translated_entries[position].text)
+                    ]
+                    store_translations(cache_path, model, batch_translations)
+                    stored_keys.update(key for key, _ in batch_translations)
+                
+                ready_start = next_to_write
+                while next_to_write < len(translated_entries) and translated_entries[next_to_write] is not None:
+                    next_to_write += 1
+                if partial_file and next_to_write > ready_start:
+                    partial_file.write(''.join(f"{entry}\n" for entry in translated_entries[ready_start:next_to_write]))
+                    partial_file.flush()
+            
+            # Если все взято из кэша - задач не было, дописываем целиком
+            if partial_file and next_to_write < len(translated_entries):
+                partial_file.write(''.join(f"{entry}\n" for entry in translated_entries[next_to_write:]))
+        finally:
+            if partial_file:
+                partial_file.close()
         
-        # Проверяем прогресс
-        prev_untranslated = untranslated_count
-        untranslated_count = sum(1 for e in translated_entries if re.search(r'[А-Яа-яЁё]', e.text))
+        # ПРОВЕРКА КАЧЕСТВА: сначала убедимся что все переведено, ПОТОМ делаем post-processing
+        print(f"🔍 Проверяю качество перевода...", flush=True)
+        # Запоминаем позиции непереведенных записей - дальше проверяем только их, а не весь список
+        untranslated_positions = [i for i, e in enumerate(translated_entries) if has_cyrillic(e.text)]
         
-        if untranslated_count == 0:
-            print(f"   ✅ Все записи успешно переведены после retry #{retry_round}!", flush=True)
-            break
-        elif untranslated_count < prev_untranslated:
-            print(f"   📉 Прогресс: {prev_untranslated} → {untranslated_count} непереведенных", flush=True)
-        else:
-            print(f"   ⚠️  Нет прогресса: все еще {untranslated_count} непереведенных", flush=True)
+        # RETRY LOGIC - делаем ДО post-processing чтобы индексы не менялись
+        retry_round = 0
+        max_retries = 2
+        
+        while untranslated_positions and retry_round < max_retries:
+            retry_round += 1
+            print(f"\n⚠️  Обнаружено {len(untranslated_positions)} непереведенных записей", flush=True)
+            
+            # Собираем непереведенные записи с их индексами (одинаковый исходный текст - один раз)
+            retry_position_by_text = {}
+            for position in untranslated_positions:
+                retry_position_by_text.setdefault(entries[position].text, position)
+            retry_positions = list(retry_position_by_text.values())
+            untranslated_indices = [entries[i].index for i in retry_positions]
+            print(f"   📋 Индексы: {untranslated_indices[:10]}{'...' if len(untranslated_indices) > 10 else ''}", flush=True)
+            # Повторно отправляются только пропущенные строки, мелкими батчами: модель теряет строки
+            # в длинных ответах, а 10 строк почти всегда возвращаются целиком
+            retry_batch_size = 10
+            print(f"   🔄 Запускаю retry #{retry_round}/{max_retries} (батчи по {retry_batch_size})...", flush=True)
+            
+            retry_batches = plan_translation_batches(entries, retry_positions, retry_batch_size)
+            retry_tasks = [
+                translate_batch_async([translated_entries[i] for i in positions], batch_num, len(retry_batches), async_client, model, limiter)
+                for batch_num, positions in enumerate(retry_batches, 1)
+            ]
+            
+            retry_results = await asyncio.gather(*retry_tasks)
+            
+            # Батч возвращает записи в том же порядке, что получил - сопоставляем по позиции,
+            # раздаем результат всем копиям текста и заменяем только успешно переведенные (без кириллицы)
+            prev_untranslated = len(untranslated_positions)
+            still_untranslated = []
+            retried_entries = (entry for batch_result in retry_results for entry in batch_result)
+            retried_by_text = {
+                entries[position].text: entry.text
+                for position, entry in zip(retry_positions, retried_entries)
+            }
+            for position in untranslated_positions:
+                retried_text = retried_by_text[entries[position].text]
+                if has_cyrillic(retried_text):
+                    still_untranslated.append(position)
+                else:
+                    original = entries[position]
+                    translated_entries[position] = SubtitleEntry(original.index, original.start_time, original.end_time, retried_text)
+            untranslated_positions = still_untranslated
+            
+            # Проверяем прогресс
+            untranslated_count = len(untranslated_positions)
+            
+            if untranslated_count == 0:
+                print(f"   ✅ Все записи успешно переведены после retry #{retry_round}!", flush=True)
+                break
+            elif untranslated_count < prev_untranslated:
+                print(f"   📉 Прогресс: {prev_untranslated} → {untranslated_count} непереведенных", flush=True)
+            else:
+                print(f"   ⚠️  Нет прогресса: все еще {untranslated_count} непереведенных", flush=True)
+    finally:
+        if own_client:
+            await async_client.close()
     
     # Финальная проверка
-    final_untranslated = sum(1 for e in translated_entries if re.search(r'[А-Яа-яЁё]', e.text))
-    if final_untranslated > 0:
-        print(f"\n⚠️  ВНИМАНИЕ: {final_untranslated} записей остались непереведенными после {retry_round} retry", flush=True)
-        failed_indices = [e.index for e in translated_entries if re.search(r'[А-Яа-яЁё]', e.text)]
+    if untranslated_positions:
+        print(f"\n⚠️  ВНИМАНИЕ: {len(untranslated_positions)} записей остались непереведенными после {retry_round} retry", flush=True)
+        failed_indices = [translated_entries[i].index for i in untranslated_positions]
         print(f"   Непереведенные индексы: {failed_indices}", flush=True)
         print(f"   💡 Эти записи сохранятся на русском языке", flush=True)
     else:
         print(f"✅ Все записи успешно переведены!", flush=True)
     
-    # POST-PROCESSING: разбиваем длинные английские субтитры (>2 строк)
-    # Делим слова пополам + время пропорционально (рекурсивно пока <= 2 строк)
+    # Досохраняем переводы из retry раундов (с кириллицей не кэшируем - их стоит перевести заново)
+    if cache_path:
+        retried_translations = {
+            cache_keys[i]: translated_entries[i].text
+            for i in miss_positions
+            if cache_keys[i] not in stored_keys and not has_cyrillic(translated_entries[i].text)
+        }
+        store_translations(cache_path, model, list(retried_translations.items()))
+        print(f"💾 В кэш переводов добавлено {len(stored_keys) + len(retried_translations)} записей", flush=True)
+    
+    return translated_entries
+
+
+def translate_subtitles(
+    entries: List[SubtitleEntry],
+    api_key: str,
+    model: str = "gpt-4o-mini",
+    partial_path: str = None,
+    cache_path: str = None,
+    use_batch_api: bool = False
+) -> List[SubtitleEntry]:
+    """
+    Обертка для запуска асинхронного перевода из синхронного кода
+    """
+    # Для Windows: устанавливаем правильную политику event loop
+    if sys.platform == 'win32':
+        asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
+    
+    try:
+        translated_entries = asyncio.run(translate_subtitles_async(
+            entries, api_key, model, partial_path, cache_path, use_batch_api=use_batch_api
+        ))
+    finally:
+        # Подавляем ошибки закрытия event loop на Windows
+        if sys.platform == 'win32':
+            import warnings
+            warnings.filterwarnings('ignore', category=RuntimeWarning, message='.*Event loop is closed.*')
+    
+    # POST-PROCESSING вне event loop: чистая CPU-работа, сетевых ожиданий здесь нет
     print(f"\n📐 Post-processing: разбиваю длинные субтитры на части (макс 2 строки)...", flush=True)
-    final_entries = []
-    for entry in translated_entries:
-        # Рекурсивно делим если > 2 строк
-        parts = split_subtitle_entry(entry, max_lines=2)
-        final_entries.extend(parts)
+    final_entries = split_long_entries(translated_entries, max_lines=2)
     
     print(f"✅ Перевод завершен: {len(entries)} → {len(final_entries)} записей (после разбиения длинных)", flush=True)
     return final_entries
 
 
-def translate_subtitles(entries: List[SubtitleEntry], api_key: str, model: str = "gpt-4o-mini") -> List[SubtitleEntry]:
+async def transcribe_and_translate_async(
+    video_path: str,
+    api_key: str,
+    model: str = "gpt-4o-mini",
+    cache_dir: str = None,
+    parallel: bool = False,
+    cache_path: str = None,
+    partial_path: str = None
+) -> Tuple[str, List[SubtitleEntry]]:
     """
-    Обертка для запуска асинхронного перевода из синхронного кода
+    Транскрипция и перевод конвейером: каждый готовый чанк сразу уходит в перевод,
+    пока Whisper обрабатывает следующие - общее время ~max(транскрипция, перевод), а не сумма
+    Один клиент (пул соединений) и один ограничитель одновременных запросов на все чанки:
+    иначе при --parallel или из кэша чанков переводы всех чанков шли бы с OPENAI_MAX_CONCURRENCY каждый
+    partial_path: переводы чанков дописываются туда по порядку чанков, как только готовы
+    Возвращает кортеж (русский SRT контент, переведенные записи 1:1 с русскими)
+    """
+    translation_tasks = {}
+    chunk_sources = {}
+    limiter = AdaptiveConcurrencyLimiter(OPENAI_MAX_CONCURRENCY)
+    
+    # Промежуточный перевод: непрерывный префикс готовых чанков (номера чанков с 1), сквозная нумерация
+    partial_file = open(partial_path, 'w', encoding='utf-8') if partial_path else None
+    partial_state = {'next_chunk': 1, 'next_index': 1, 'transcribed': False}
+    
+    def write_ready_chunks(_task=None):
+        while True:
+            chunk_num = partial_state['next_chunk']
+            task = translation_tasks.get(chunk_num)
+            if task is None:
+                # После транскрипции задачи уже не появятся: чанк с ошибкой транскрипции пропускаем,
+                # иначе следующие готовые чанки так и не попали бы в partial файл
+                if partial_state['transcribed'] and chunk_num < max(translation_tasks, default=0):
+                    print(f"   ⚠️  Чанк {chunk_num} не транскрибирован - в промежуточном переводе его не будет", flush=True)
+                    partial_state['next_chunk'] += 1
+                    continue
+                return
+            if not task.done() or task.cancelled() or task.exception() is not None:
+                return
+            for entry in task.result():
+                partial_file.write(f"{SubtitleEntry(partial_state['next_index'], entry.start_time, entry.end_time, entry.text)}\n")
+                partial_state['next_index'] += 1
+            partial_file.flush()
+            partial_state['next_chunk'] += 1
+    
+    async with create_async_client(api_key) as async_client:
+        def start_translation(chunk_num: int, transcript: str):
+            chunk_entries = parse_srt(transcript)
+            chunk_sources[chunk_num] = chunk_entries
+            print(f"   🌐 Чанк {chunk_num}: {len(chunk_entries)} записей отправлены в перевод")
+            translation_tasks[chunk_num] = asyncio.create_task(translate_subtitles_async(
+                chunk_entries, api_key, model, cache_path=cache_path, async_client=async_client, limiter=limiter
+            ))
+            if partial_file:
+                translation_tasks[chunk_num].add_done_callback(write_ready_chunks)
+        
+        try:
+            srt_content = await transcribe_audio_async(
+                video_path, api_key, sequential=not parallel, cache_dir=cache_dir,
+                async_client=async_client, on_chunk_done=start_translation
+            )
+        except BaseException:
+            for task in translation_tasks.values():
+                task.cancel()
+            if partial_file:
+                partial_file.close()
+            raise
+        
+        partial_state['transcribed'] = True
+        if partial_file:
+            write_ready_chunks()
+        
+        print(f"\n⏳ Транскрипция готова, дожидаюсь перевода оставшихся чанков...", flush=True)
+        try:
+            chunk_translations = [await translation_tasks[chunk_num] for chunk_num in sorted(translation_tasks)]
+        finally:
+            if partial_file:
+                partial_file.close()
+        
+        russian_entries = parse_srt(srt_content)
+        translated_texts = [entry.text for chunk in chunk_translations for entry in chunk]
+        source_texts = [entry.text for chunk_num in sorted(chunk_sources) for entry in chunk_sources[chunk_num]]
+        if len(translated_texts) != len(russian_entries):
+            # Не должно случаться (склейка не теряет записей), но лучше перевести заново, чем сдвинуть текст
+            print(f"⚠️  Перевод по чанкам не совпал по числу записей ({len(translated_texts)} vs {len(russian_entries)}), перевожу целиком...", flush=True)
+            translated_entries = await translate_subtitles_async(
+                russian_entries, api_key, model, cache_path=cache_path, async_client=async_client, limiter=limiter
+            )
+            return (srt_content, translated_entries)
+        
+        # При склейке с первого субтитра чанка мог быть убран повтор слов со стыка -
+        # такие записи (единицы) переводим заново по итоговому тексту
+        changed_positions = [i for i, entry in enumerate(russian_entries) if entry.text != source_texts[i]]
+        if changed_positions:
+            print(f"🔁 Перевожу заново {len(changed_positions)} записей на стыках чанков...", flush=True)
+            retranslated = await translate_subtitles_async(
+                [russian_entries[i] for i in changed_positions], api_key, model,
+                cache_path=cache_path, async_client=async_client, limiter=limiter
+            )
+            for position, entry in zip(changed_positions, retranslated):
+                translated_texts[position] = entry.text
+    
+    # Индексы и тайминги берем из склеенного SRT (сквозная нумерация), текст - из перевода чанков
+    translated_entries = [
+        SubtitleEntry(entry.index, entry.start_time, entry.end_time, text)
+        for entry, text in zip(russian_entries, translated_texts)
+    ]
+    return (srt_content, translated_entries)
+
+
+def transcribe_and_translate(
+    video_path: str,
+    api_key: str,
+    model: str = "gpt-4o-mini",
+    cache_dir: str = None,
+    parallel: bool = False,
+    cache_path: str = None,
+    partial_path: str = None
+) -> Tuple[str, List[SubtitleEntry]]:
+    """
+    Обертка для запуска конвейера транскрипция+перевод из синхронного кода
+    Возвращает кортеж (русский SRT контент, финальные английские записи после разбивки длинных)
     """
     # Для Windows: устанавливаем правильную политику event loop
     if sys.platform == 'win32':
         asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
     
     try:
-        return asyncio.run(translate_subtitles_async(entries, api_key, model))
+        srt_content, translated_entries = asyncio.run(
+            transcribe_and_translate_async(video_path, api_key, model, cache_dir, parallel, cache_path, partial_path)
+        )
     finally:
         # Подавляем ошибки закрытия event loop на Windows
         if sys.platform == 'win32':
             import warnings
             warnings.filterwarnings('ignore', category=RuntimeWarning, message='.*Event loop is closed.*')
+    
+    # POST-PROCESSING вне event loop: чистая CPU-работа, сетевых ожиданий здесь нет
+    print(f"\n📐 Post-processing: разбиваю длинные субтитры на части (макс 2 строки)...", flush=True)
+    final_entries = split_long_entries(translated_entries, max_lines=2)
+    
+    print(f"✅ Перевод завершен: {len(translated_entries)} → {len(final_entries)} записей (после разбиения длинных)", flush=True)
+    return (srt_content, final_entries)
 
 
 def save_srt(entries: List[SubtitleEntry], output_path: str) -> None:
     """Сохраняет субтитры в SRT файл"""
     print(f"💾 Сохраняю субтитры в {output_path}...")
     
-    with open(output_path, 'w', encoding='utf-8') as f:
-        for entry in entries:
-            f.write(str(entry) + '\n')
+    # Собираем весь файл одной строкой и пишем одним вызовом
+    content = ''.join(
+        f"{entry.index}\n{entry.start_time} --> {entry.end_time}\n{entry.text}\n\n"
+        for entry in entries
+    )
+    # Пишем во временный файл и подменяем одним rename: при обрыве не останется обрезанного SRT
+    # (особенно важно для russian.srt - при его наличии транскрипция пропускается)
+    temp_path = f"{output_path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8', buffering=1 << 20) as f:
+        f.write(content)
+    os.replace(temp_path, output_path)
     
     print(f"✅ Субтитры сохранены")
 
 
 def burn_subtitles(video_path: str, srt_path: str, output_path: str) -> None:
     """Вшивает субтитры в видео (hardcoded)"""
-    print(f"🎬 Вшиваю субтитры в видео...")
+    encoder = detect_video_encoder(FFMPEG_PATH)
+    print(f"🎬 Вшиваю субтитры в видео ({encoder})...")
     
     # Конвертируем пути для ffmpeg (особенно важно для Windows)
     srt_path_escaped = srt_path.replace('\\', '/').replace(':', '\\:')
     
+    # Аппаратный кодировщик может не открыться на старте (нет GPU / драйвера), хоть и прошел пробный кадр -
+    # тогда кодируем заново через libx264; остальные ошибки (SRT, диск, вход) повтор не исправит
+    encoders = [encoder] if encoder == 'libx264' else [encoder, 'libx264']
+    for encoder in encoders:
+        cmd = [
+            FFMPEG_PATH,
+            '-hide_banner', '-nostats',  # строки прогресса все равно никто не видит - не гоняем их через пайп
+            '-i', video_path,
+            '-vf', f"subtitles='{srt_path_escaped}':force_style='FontName=Arial,FontSize=12,PrimaryColour=&H00FFFFFF,OutlineColour=&H00000000,BackColour=&H80404040,BorderStyle=3,Outline=1,Shadow=0,MarginV=10'",
+            '-c:v', encoder,  # видео перекодируется в любом случае (субтитры рисуются в кадре)
+            *VIDEO_ENCODER_ARGS.get(encoder, []),
+            '-c:a', 'copy',  # копируем аудио без перекодирования
+            '-y',
+            output_path
+        ]
+        
+        try:
+            run_ffmpeg(cmd)
+            print(f"✅ Видео с субтитрами: {output_path}")
+            return
+        except subprocess.CalledProcessError as e:
+            stderr_text = e.stderr.decode(errors='replace')
+            if encoder != encoders[-1] and any(marker in stderr_text.lower() for marker in VIDEO_ENCODER_INIT_ERRORS):
+                print(f"⚠️  Кодировщик {encoder} не запустился, кодирую через libx264...")
+                continue
+            print(f"❌ Ошибка при вшивании субтитров: {stderr_text}")
+            raise
+
+
+def mux_soft_subtitles(video_path: str, srt_path: str, output_path: str) -> None:
+    """
+    Добавляет субтитры отдельной дорожкой (mov_text), без перекодирования видео и аудио
+    Секунды вместо минут, но субтитры включаются в плеере (VLC, YouTube, iOS их показывают)
+    """
+    print(f"🎬 Добавляю субтитры дорожкой в видео (без перекодирования)...")
+    
     cmd = [
-        FFMPEG_PATH, '-i', video_path,
-        '-vf', f"subtitles='{srt_path_escaped}':force_style='FontName=Arial,FontSize=12,PrimaryColour=&H00FFFFFF,OutlineColour=&H00000000,BackColour=&H80404040,BorderStyle=3,Outline=1,Shadow=0,MarginV=10'",
-        '-c:a', 'copy',  # копируем аудио без перекодирования
+        FFMPEG_PATH,
+        '-hide_banner', '-nostats',
+        '-i', video_path,
+        '-i', srt_path,
+        '-map', '0:v', '-map', '0:a?', '-map', '1:0',  # старые дорожки субтитров источника не берем
+        '-c', 'copy',  # видео и аудио копируются как есть
+        '-c:s', 'mov_text',  # формат субтитров для mp4
+        '-metadata:s:s:0', 'language=eng',
         '-y',
         output_path
     ]
     
     try:
-        subprocess.run(cmd, check=True, capture_output=True)
+        run_ffmpeg(cmd)
         print(f"✅ Видео с субтитрами: {output_path}")
     except subprocess.CalledProcessError as e:
-        print(f"❌ Ошибка при вшивании субтитров: {e.stderr.decode()}")
+        print(f"❌ Ошибка при добавлении субтитров: {e.stderr.decode()}")
         raise
 
 
@@ -1056,6 +2230,7 @@ def main():
   python subtitle_improver.py video.mp4
   python subtitle_improver.py video.mp4 --model gpt-4o
   python subtitle_improver.py video.mp4 --skip-burn
+  python subtitle_improver.py video.mp4 --soft-sub
 
 Переменные окружения:
   OPENAI_API_KEY - ваш API ключ OpenAI (обязательно)
@@ -1069,12 +2244,24 @@ def main():
                         help='Модель GPT для перевода (по умолчанию: gpt-4o, можно также задать в .env файле)')
     parser.add_argument('--skip-burn', action='store_true',
                         help='Не вшивать субтитры в видео, только создать .srt файл')
+    parser.add_argument('--soft-sub', action='store_true',
+                        help='Добавить субтитры отдельной дорожкой (mov_text) без перекодирования видео - '
+                             'в разы быстрее, но субтитры включаются в плеере, а не нарисованы в кадре')
     parser.add_argument('--force-retranscribe', action='store_true',
                         help='Игнорировать кэш чанков и транскрибировать заново')
     parser.add_argument('--step', 
                         choices=['all', 'transcribe', 'translate', 'burn'],
                         default='all',
                         help='Какой этап выполнить: all (все), transcribe (только транскрипция), translate (только перевод), burn (только вшивание)')
+    parser.add_argument('--backend',
+                        choices=['openai', 'faster-whisper', 'auto'],
+                        default=os.environ.get('TRANSCRIBE_BACKEND', 'openai'),
+                        help='Чем транскрибировать: openai (Whisper API, по умолчанию), faster-whisper (локально, int8, без API) '
+                             'или auto (faster-whisper если установлен, иначе openai); можно задать TRANSCRIBE_BACKEND в .env')
+    parser.add_argument('--parallel', action='store_true',
+                        help='Отправлять чанки в Whisper API одновременно (до WHISPER_MAX_PARALLEL) - быстрее, но без контекста между чанками')
+    parser.add_argument('--batch-api', action='store_true',
+                        help='Переводить через OpenAI Batch API - в 2 раза дешевле, но результат может идти до 24 часов')
     
     args = parser.parse_args()
     
@@ -1101,8 +2288,19 @@ def main():
         print(f"❌ Ошибка: файл не найден: {args.video}")
         sys.exit(1)
     
+    # Значение по умолчанию из TRANSCRIBE_BACKEND argparse не проверяет по choices
+    if args.backend not in ('openai', 'faster-whisper', 'auto'):
+        parser.error(f"неизвестный бэкенд транскрипции: {args.backend} (TRANSCRIBE_BACKEND)")
+    
+    # auto: локальная транскрипция если faster-whisper установлен - без сети, лимитов и нарезки на чанки
+    if args.backend == 'auto':
+        args.backend = 'faster-whisper' if FASTER_WHISPER_AVAILABLE else 'openai'
+        print(f"🎛️  Бэкенд транскрипции: {args.backend}", flush=True)
+    
     # Инициализируем пути к ffmpeg и ffprobe (только для этапов которым они нужны)
-    if args.step in ['all', 'transcribe', 'burn']:
+    # faster-whisper декодирует аудио сам, ffmpeg ему не нужен
+    needs_ffmpeg = args.step in ['all', 'burn'] or (args.step == 'transcribe' and args.backend == 'openai')
+    if needs_ffmpeg:
         global FFMPEG_PATH, FFPROBE_PATH
         
         FFMPEG_PATH = find_ffmpeg()
@@ -1129,21 +2327,14 @@ def main():
             print()
             print("   📍 Программа искала ffmpeg в следующих местах:")
             print("      - Системный PATH")
-            print("      - C:\\ffmpeg\\bin\\")
-            print("      - C:\\Program Files\\ffmpeg\\bin\\")
-            print(f"      - {os.path.expanduser('~\\ffmpeg\\bin\\')}")
-            print("      - C:\\ProgramData\\chocolatey\\bin\\")
-            print(f"      - {os.path.expanduser('~\\scoop\\apps\\ffmpeg\\')}")
-            print(f"      - {os.getcwd()} (текущая папка)")
+            for directory in FFMPEG_SEARCH_DIRS:
+                print(f"      - {directory}")
             print()
             sys.exit(1)
         
         print(f"✅ Найден ffmpeg: {FFMPEG_PATH}")
         print(f"✅ Найден ffprobe: {FFPROBE_PATH}")
     
-    # Инициализируем OpenAI клиент с увеличенным таймаутом
-    client = OpenAI(api_key=api_key, timeout=1200.0)  # 20 минут для больших файлов
-    
     # Создаем структуру папок для выходных файлов
     base_name = video_path.stem
     outputs_dir = video_path.parent / "outputs" / base_name
@@ -1164,6 +2355,14 @@ def main():
     
     print(f"📁 Папка с результатами: {run_dir}", flush=True)
     
+    # Кэш переводов общий для всех видео в outputs - повторный перевод тех же строк бесплатный
+    translation_cache = video_path.parent / "outputs" / "translations.sqlite"
+    
+    # Русские записи после транскрипции в этом же запуске - этап перевода берет их из памяти
+    # (а при --step all перевод может быть уже готов - он идет конвейером вместе с транскрипцией)
+    russian_entries = None
+    translated_entries = None
+    
     print(f"\n{'='*60}", flush=True)
     print(f"🚀 Начинаю обработку видео: {video_path.name}", flush=True)
     print(f"{'='*60}\n", flush=True)
@@ -1177,15 +2376,6 @@ def main():
                 print(f"ℹ️  Русские субтитры уже существуют: {russian_srt}")
                 print(f"   Удалите файл если хотите перетранскрибировать")
             else:
-                # Шаг 1: Извлекаем аудио
-                with tempfile.NamedTemporaryFile(suffix='.mp3', delete=False) as tmp_audio:
-                    audio_path = tmp_audio.name
-                
-                extract_audio(str(video_path), audio_path)
-                
-                # Шаг 2: Разбиваем на части если нужно
-                audio_chunks = split_audio(audio_path)
-                
                 # Создаем папку для кэша чанков
                 chunks_cache_dir = outputs_dir / "chunks"
                 
@@ -1195,35 +2385,47 @@ def main():
                     shutil.rmtree(chunks_cache_dir)
                     print(f"🗑️  Удален старый кэш чанков, будет выполнена полная транскрибация", flush=True)
                 
-                # Шаг 3: Транскрибируем через Whisper (возвращает SRT)
-                # Кэшируем чанки чтобы не транскрибировать повторно
-                srt_content = transcribe_audio(audio_chunks, client, cache_dir=str(chunks_cache_dir))
-                
-                # Удаляем временные аудио файлы
-                for chunk in audio_chunks:
-                    if os.path.exists(chunk):
-                        os.unlink(chunk)
-                if audio_path not in audio_chunks and os.path.exists(audio_path):
-                    os.unlink(audio_path)
+                if args.backend == 'faster-whisper':
+                    # Локальная транскрипция: без API, без чанков и смещений
+                    srt_content = transcribe_audio_local(str(video_path))
+                elif step == 'all' and not args.batch_api:
+                    # Полный прогон: каждый готовый чанк сразу уходит в перевод, не дожидаясь остальных
+                    # (с --batch-api перевод идет одним заданием после транскрипции)
+                    # Готовые чанки перевода сразу дописываются в partial файл
+                    partial_srt = run_dir / "improved.partial.srt"
+                    print(f"📝 Промежуточный перевод пишется в {partial_srt.name}", flush=True)
+                    srt_content, translated_entries = transcribe_and_translate(
+                        str(video_path), api_key, model,
+                        cache_dir=str(chunks_cache_dir),
+                        parallel=args.parallel,
+                        cache_path=str(translation_cache),
+                        partial_path=str(partial_srt)
+                    )
+                else:
+                    # Извлекаем аудио сразу частями и транскрибируем через Whisper (возвращает SRT)
+                    # Части отправляются в Whisper по мере готовности и удаляются после обработки
+                    # Кэшируем чанки чтобы не транскрибировать повторно
+                    srt_content = transcribe_audio(str(video_path), api_key, cache_dir=str(chunks_cache_dir), parallel=args.parallel)
                 
-                # Debug: сохраняем RAW SRT во временный файл для анализа
-                temp_raw_path = str(russian_srt).replace('.srt', '_raw_debug.srt')
-                with open(temp_raw_path, 'w', encoding='utf-8') as f:
-                    f.write(srt_content)
-                print(f"🐛 Debug: RAW SRT сохранен в {temp_raw_path}", flush=True)
+                # Debug: сохраняем RAW SRT для анализа (только с SUBTITLE_DEBUG=1 - на длинных видео это мегабайты)
+                if SUBTITLE_DEBUG:
+                    temp_raw_path = russian_srt.with_name(f"{russian_srt.stem}_raw_debug.srt")
+                    temp_raw_path.write_text(srt_content, encoding='utf-8')
+                    print(f"🐛 Debug: RAW SRT сохранен в {temp_raw_path}", flush=True)
                 
                 # Парсим и сохраняем русские субтитры
                 print(f"📝 Парсинг субтитров...", flush=True)
                 
                 # Debug: сколько блоков в raw SRT
-                raw_blocks = srt_content.strip().split('\n\n')
-                print(f"   🔍 Raw SRT: {len(raw_blocks)} блоков, {len(srt_content)} символов", flush=True)
+                # (считаем разделители, а не режем текст на список блоков - он нужен только для числа)
+                raw_block_count = srt_content.strip().count('\n\n') + 1
+                print(f"   🔍 Raw SRT: {raw_block_count} блоков, {len(srt_content)} символов", flush=True)
                 
                 russian_entries = parse_srt(srt_content)
-                print(f"   ✅ Распарсено: {len(russian_entries)} записей из {len(raw_blocks)} блоков", flush=True)
+                print(f"   ✅ Распарсено: {len(russian_entries)} записей из {raw_block_count} блоков", flush=True)
                 
-                if len(russian_entries) < len(raw_blocks):
-                    print(f"   ⚠️  ВНИМАНИЕ: Потеряно {len(raw_blocks) - len(russian_entries)} блоков при парсинге!", flush=True)
+                if len(russian_entries) < raw_block_count:
+                    print(f"   ⚠️  ВНИМАНИЕ: Потеряно {raw_block_count - len(russian_entries)} блоков при парсинге!", flush=True)
                 
                 print(f"💾 Сохраняю русские субтитры в {russian_srt}...", flush=True)
                 save_srt(russian_entries, str(russian_srt))
@@ -1243,34 +2445,46 @@ def main():
         # ЭТАП 2: ПЕРЕВОД (GPT)
         # ========================================
         if step in ['all', 'translate']:
-            # Загружаем русские субтитры
-            if not russian_srt.exists():
-                # Пробуем найти старый формат файла (для миграции)
-                old_russian_srt = video_path.parent / f"{base_name}_russian.srt"
-                if old_russian_srt.exists():
-                    print(f"ℹ️  Найден файл в старом формате, перемещаю в новую структуру...", flush=True)
-                    russian_srt.parent.mkdir(parents=True, exist_ok=True)
-                    old_russian_srt.rename(russian_srt)
-                    print(f"✅ Файл перемещен в: {russian_srt.relative_to(video_path.parent)}", flush=True)
-                else:
-                    print(f"❌ Ошибка: файл {russian_srt} не найден")
-                    print(f"   Сначала запустите: python subtitle_improver.py {args.video} --step transcribe")
-                    sys.exit(1)
-            
-            print(f"📖 Загружаю русские субтитры из {russian_srt}...", flush=True)
-            with open(russian_srt, 'r', encoding='utf-8') as f:
-                srt_content = f.read()
-            
-            # Парсим SRT
-            print(f"📝 Парсинг субтитров...", flush=True)
-            russian_entries = parse_srt(srt_content)
-            print(f"✅ Найдено {len(russian_entries)} записей субтитров", flush=True)
-            
-            # Переводим через GPT (параллельно!)
-            translated_entries = translate_subtitles(russian_entries, api_key, model)
+            # Перевод уже готов, если шел конвейером вместе с транскрипцией
+            if translated_entries is None:
+                # Загружаем русские субтитры (если транскрипция была в этом запуске - они уже в памяти)
+                if russian_entries is None:
+                    if not russian_srt.exists():
+                        # Пробуем найти старый формат файла (для миграции)
+                        old_russian_srt = video_path.parent / f"{base_name}_russian.srt"
+                        if old_russian_srt.exists():
+                            print(f"ℹ️  Найден файл в старом формате, перемещаю в новую структуру...", flush=True)
+                            russian_srt.parent.mkdir(parents=True, exist_ok=True)
+                            old_russian_srt.rename(russian_srt)
+                            print(f"✅ Файл перемещен в: {russian_srt.relative_to(video_path.parent)}", flush=True)
+                        else:
+                            print(f"❌ Ошибка: файл {russian_srt} не найден")
+                            print(f"   Сначала запустите: python subtitle_improver.py {args.video} --step transcribe")
+                            sys.exit(1)
+                    
+                    print(f"📖 Загружаю русские субтитры из {russian_srt}...", flush=True)
+                    with open(russian_srt, 'r', encoding='utf-8') as f:
+                        srt_content = f.read()
+                    
+                    # Парсим SRT
+                    print(f"📝 Парсинг субтитров...", flush=True)
+                    russian_entries = parse_srt(srt_content)
+                    print(f"✅ Найдено {len(russian_entries)} записей субтитров", flush=True)
+                
+                # Переводим через GPT (параллельно!)
+                # Готовые батчи сразу дописываются в partial файл - его можно смотреть до конца перевода
+                partial_srt = run_dir / "improved.partial.srt"
+                print(f"📝 Промежуточный перевод пишется в {partial_srt.name}", flush=True)
+                translated_entries = translate_subtitles(
+                    russian_entries, api_key, model,
+                    partial_path=str(partial_srt),
+                    cache_path=str(translation_cache),
+                    use_batch_api=args.batch_api
+                )
             
-            # Сохраняем улучшенные субтитры
+            # Сохраняем улучшенные субтитры (с retry и разбивкой) - partial больше не нужен
             save_srt(translated_entries, str(output_srt))
+            (run_dir / "improved.partial.srt").unlink(missing_ok=True)
         
         # Если только перевод - выходим
         if step == 'translate':
@@ -1289,10 +2503,19 @@ def main():
         if step in ['all', 'burn']:
             # Для burn ищем последний run с субтитрами
             if step == 'burn' and not output_srt.exists():
-                # Ищем последнюю папку run_* с improved.srt
-                run_dirs = sorted(outputs_dir.glob("run_*/improved.srt"))
-                if run_dirs:
-                    latest_srt = run_dirs[-1]
+                # Ищем последнюю папку run_* с improved.srt: имена содержат timestamp,
+                # поэтому достаточно одного прохода scandir с max по имени (без glob и сортировки)
+                with os.scandir(outputs_dir) as entries:
+                    latest_run = max(
+                        (
+                            entry.name for entry in entries
+                            if entry.name.startswith('run_') and entry.is_dir()
+                            and os.path.isfile(os.path.join(entry.path, 'improved.srt'))
+                        ),
+                        default=None
+                    )
+                if latest_run:
+                    latest_srt = outputs_dir / latest_run / "improved.srt"
                     print(f"📖 Использую субтитры из предыдущего запуска: {latest_srt.parent.name}", flush=True)
                     # Создаем новую папку для burn
                     output_srt = latest_srt  # Используем существующие
@@ -1304,6 +2527,8 @@ def main():
             
             if args.skip_burn:
                 print(f"⏭️  Пропускаю вшивание субтитров (--skip-burn)", flush=True)
+            elif args.soft_sub:
+                mux_soft_subtitles(str(video_path), str(output_srt), str(output_video))
             else:
                 burn_subtitles(str(video_path), str(output_srt), str(output_video))
         
@@ -0,0 +1,46 @@
+"""Откат с аппаратного кодировщика на libx264 при вшивании субтитров"""
+
+import subprocess
+
+import pytest
+
+import subtitle_improver
+
+
+def run_burn(monkeypatch, failures, commands):
+    """Запускает burn_subtitles с h264_nvenc; failures - stderr падений по кодировщику, commands - куда писать кодировщики запусков"""
+    def fake_run_ffmpeg(cmd):
+        encoder = cmd[cmd.index('-c:v') + 1]
+        commands.append(encoder)
+        if encoder in failures:
+            raise subprocess.CalledProcessError(1, cmd, stderr=failures[encoder])
+    
+    monkeypatch.setattr(subtitle_improver, 'FFMPEG_PATH', 'ffmpeg')
+    monkeypatch.setattr(subtitle_improver, 'detect_video_encoder', lambda ffmpeg_path: 'h264_nvenc')
+    monkeypatch.setattr(subtitle_improver, 'run_ffmpeg', fake_run_ffmpeg)
+    subtitle_improver.burn_subtitles('in.mp4', 'subs.srt', 'out.mp4')
+
+
+def test_falls_back_to_libx264_when_hardware_encoder_fails_to_open(monkeypatch):
+    stderr = b"[h264_nvenc @ 0x1] No NVENC capable devices found\n[vost#0:0/h264_nvenc] Error while opening encoder\n"
+    
+    commands = []
+    
+    run_burn(monkeypatch, {'h264_nvenc': stderr}, commands)
+    
+    assert commands == ['h264_nvenc', 'libx264']
+
+
+def test_other_ffmpeg_errors_are_raised_without_reencoding(monkeypatch, capsys):
+    stderr = b"[Parsed_subtitles_0 @ 0x1] Unable to open subs.srt\nError opening output files: No space left on device\n"
+    
+    commands = []
+    
+    with pytest.raises(subprocess.CalledProcessError):
+        run_burn(monkeypatch, {'h264_nvenc': stderr}, commands)
+    
+    # Повторного кодирования нет, а настоящая ошибка ffmpeg показана пользователю
+    assert commands == ['h264_nvenc']
+    output = capsys.readouterr().out
+    assert 'не запустился' not in output
+    assert 'No space left on device' in output
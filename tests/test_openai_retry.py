@@ -0,0 +1,113 @@
+"""Повторы запросов к OpenAI: только собственный backoff скрипта, без скрытых повторов SDK"""
+
+import asyncio
+
+import httpx
+import pytest
+from openai import AsyncOpenAI
+
+import subtitle_improver
+
+
+CHAT_COMPLETION = {
+    "id": "chatcmpl-test",
+    "object": "chat.completion",
+    "created": 0,
+    "model": "gpt-4o",
+    "choices": [{
+        "index": 0,
+        "finish_reason": "stop",
+        "message": {"role": "assistant", "content": "[1] hello"},
+    }],
+}
+
+
+def make_client(responses, requests):
+    """Настоящий AsyncOpenAI поверх MockTransport: отдает ответы по очереди и считает HTTP запросы"""
+    def handler(request):
+        requests.append(request)
+        return responses.pop(0)
+    http_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return AsyncOpenAI(api_key="test", base_url="https://api.test/v1", http_client=http_client)
+
+
+def test_rate_limit_retry_after_is_honored_with_one_request_per_attempt(monkeypatch):
+    delays = []
+    real_sleep = asyncio.sleep
+    
+    async def fake_sleep(delay, *args, **kwargs):
+        delays.append(delay)
+        await real_sleep(0)
+    
+    monkeypatch.setattr(subtitle_improver.asyncio, "sleep", fake_sleep)
+    
+    requests = []
+    responses = [
+        httpx.Response(429, headers={"retry-after": "7"}, json={"error": {"message": "rate limited"}}),
+        httpx.Response(429, headers={"retry-after": "3"}, json={"error": {"message": "rate limited"}}),
+        httpx.Response(200, json=CHAT_COMPLETION),
+    ]
+    client = make_client(responses, requests)
+    limiter = subtitle_improver.AdaptiveConcurrencyLimiter(4)
+    
+    response = asyncio.run(subtitle_improver.create_chat_completion_with_backoff(
+        client, {"model": "gpt-4o", "messages": [{"role": "user", "content": "[1] привет"}]}, 1, limiter
+    ))
+    
+    assert response.choices[0].message.content == "[1] hello"
+    # Три попытки - три HTTP запроса: SDK сам ничего не повторял
+    assert len(requests) == 3
+    # Паузы - ровно из Retry-After, и только паузы скрипта
+    assert delays == [7.0, 3.0]
+    # AIMD увидел 429 сразу
+    assert limiter.limit < 4
+
+
+def test_rate_limit_gives_up_after_max_attempts(monkeypatch):
+    async def fake_sleep(delay, *args, **kwargs):
+        pass
+    
+    monkeypatch.setattr(subtitle_improver.asyncio, "sleep", fake_sleep)
+    
+    requests = []
+    responses = [
+        httpx.Response(429, headers={"retry-after": "1"}, json={"error": {"message": "rate limited"}})
+        for _ in range(subtitle_improver.OPENAI_MAX_ATTEMPTS)
+    ]
+    client = make_client(responses, requests)
+    
+    with pytest.raises(subtitle_improver.RateLimitError):
+        asyncio.run(subtitle_improver.create_chat_completion_with_backoff(
+            client, {"model": "gpt-4o", "messages": [{"role": "user", "content": "[1] привет"}]}, 1
+        ))
+    
+    assert len(requests) == subtitle_improver.OPENAI_MAX_ATTEMPTS
+
+
+def test_whisper_chunk_retries_5xx_once_per_attempt(monkeypatch, tmp_path):
+    delays = []
+    
+    async def fake_sleep(delay, *args, **kwargs):
+        delays.append(delay)
+    
+    monkeypatch.setattr(subtitle_improver.asyncio, "sleep", fake_sleep)
+    
+    chunk = tmp_path / "chunk_001.mp3"
+    chunk.write_bytes(b"\x00" * 1024)
+    srt = "1\n00:00:01,000 --> 00:00:02,000\nпривет\n"
+    requests = []
+    responses = [
+        httpx.Response(500, json={"error": {"message": "server error"}}),
+        httpx.Response(503, json={"error": {"message": "overloaded"}}),
+        httpx.Response(200, text=srt),
+    ]
+    client = make_client(responses, requests)
+    
+    chunk_num, transcript = asyncio.run(subtitle_improver.transcribe_audio_chunk_async(
+        str(chunk), 1, 1, client
+    ))
+    
+    assert (chunk_num, transcript) == (1, srt)
+    # Две 5xx и успех - ровно три загрузки чанка, и обе паузы - из цикла повторов скрипта, а не SDK
+    assert len(requests) == 3
+    assert len(delays) == 2
@@ -0,0 +1,26 @@
+"""Сдвиг таймингов SRT при склейке чанков"""
+
+import subtitle_improver
+
+
+def test_adjust_srt_timings_shifts_comma_timestamps():
+    srt = "1\n00:00:01,000 --> 00:00:04,500\nпривет\n"
+    
+    shifted = subtitle_improver.adjust_srt_timings(srt, offset_seconds=900)
+    
+    assert shifted == "1\n00:15:01,000 --> 00:15:04,500\nпривет\n"
+
+
+def test_adjust_srt_timings_shifts_dot_timestamps():
+    # Тайминги с точкой (как в VTT) parse_srt принимает - значит, и сдвигаться они должны,
+    # иначе склеенные чанки молча получают неверное время
+    srt = "1\n00:00:01.000 --> 00:00:04.000\nпривет\n\n2\n00:59:59.500 --> 01:00:00.250\nмир\n"
+    
+    shifted = subtitle_improver.adjust_srt_timings(srt, offset_seconds=1.5, index_offset=10)
+    
+    assert shifted == "11\n00:00:02,500 --> 00:00:05,500\nпривет\n\n12\n01:00:01,000 --> 01:00:01,750\nмир\n"
+    entries = subtitle_improver.parse_srt(shifted)
+    assert [(e.start_time, e.end_time) for e in entries] == [
+        ("00:00:02,500", "00:00:05,500"),
+        ("01:00:01,000", "01:00:01,750"),
+    ]